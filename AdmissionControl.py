@@ -0,0 +1,221 @@
+# --- ADMISSION CONTROL ---------------------------------------------------
+# Limita il lavoro concorrente sul percorso dei voti: oltre max_inflight le richieste attendono in una coda
+# limitata (al più queue_timeout secondi); con la coda piena o l'attesa scaduta vengono rifiutate subito,
+# così sotto carico la latenza resta limitata invece di crescere per tutti.
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class Overloaded(Exception):
+    """
+    Richiesta rifiutata dall'admission control.
+      - scope: "global" (limite del processo) o "election" (limite della singola votazione)
+      - reason: "queue_full" o "timeout"
+      - retry_after: secondi suggeriti prima di riprovare
+    """
+    def __init__(self, scope: str, reason: str, retry_after: int):
+        super().__init__(f"{scope}: {reason}")
+        self.scope = scope
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    Semaforo con coda FIFO limitata. Il posto liberato da release() passa direttamente al primo in coda,
+    quindi chi arriva non scavalca chi attende.
+    """
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout: float):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self.shed = 0
+        self._waiting: deque[asyncio.Future] = deque()
+        # durata media (EWMA) di una richiesta ammessa, per stimare Retry-After
+        self._service_time = 0.01
+        # istante in cui il limitatore è diventato inattivo (None se in uso)
+        self.idle_since: float | None = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def idle(self) -> bool:
+        return self.inflight == 0 and not self._waiting
+
+    def retry_after(self) -> int:
+        # tempo per smaltire la coda attuale con max_inflight richieste in parallelo
+        return max(1, math.ceil((len(self._waiting) + 1) * self._service_time / self.max_inflight))
+
+    async def acquire(self, scope: str):
+        if self.inflight < self.max_inflight and not self._waiting:
+            self.inflight += 1
+            return
+        if len(self._waiting) >= self.max_queue:
+            self.shed += 1
+            raise Overloaded(scope, "queue_full", self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.append(fut)
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except BaseException as e:
+            # timeout o cancellazione (es. client disconnesso) arrivati dopo aver ricevuto il posto
+            # (con Python >= 3.12 wait_for può sollevare TimeoutError anche a future già risolto): lo restituisco
+            if fut.done() and not fut.cancelled():
+                self._release_slot()
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed += 1
+                raise Overloaded(scope, "timeout", self.retry_after())
+            raise
+        finally:
+            if not fut.done():
+                fut.cancel()
+            try:
+                self._waiting.remove(fut)
+            except ValueError:
+                pass
+
+    def resize(self, max_inflight: int, max_queue: int):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        # posti in più: passano subito ai primi in coda
+        while self.inflight < self.max_inflight and self._waiting:
+            fut = self._waiting.popleft()
+            if not fut.done():
+                self.inflight += 1
+                fut.set_result(None)
+
+    def release(self, elapsed: float | None):
+        if elapsed is not None:
+            self._service_time += 0.1 * (elapsed - self._service_time)
+        self._release_slot()
+
+    def _release_slot(self):
+        while self._waiting:
+            fut = self._waiting.popleft()
+            if not fut.done():
+                # il posto passa al primo in coda: inflight non cambia
+                fut.set_result(None)
+                return
+        self.inflight -= 1
+
+
+class AdmissionControl:
+    """
+    Limite globale del processo più un limite per votazione, così una votazione molto attiva
+    non occupa tutti i posti. I limiti per votazione sono quelli di default oppure quelli impostati con configure().
+    I limitatori per votazione vengono creati al primo uso ed eliminati dopo idle_ttl secondi di inattività
+    (così la durata media del servizio, usata per Retry-After, non riparte da zero a ogni raffica di voti).
+    Un limite max_inflight <= 0 disattiva il relativo controllo.
+    """
+    def __init__(self, max_inflight: int, max_queue: int, election_max_inflight: int, election_max_queue: int,
+                 queue_timeout: float, idle_ttl: float = 300.0):
+        self.global_limiter = Limiter(max_inflight, max_queue, queue_timeout) if max_inflight > 0 else None
+        self._election_limits = (election_max_inflight, election_max_queue)
+        self.queue_timeout = queue_timeout
+        self.idle_ttl = idle_ttl
+        # limiti specifici per votazione: votazione_id -> (max_inflight, max_queue)
+        self._overrides: dict[str, tuple[int, int]] = {}
+        self._elections: dict[str, Limiter] = {}
+        self._next_sweep = 0.0
+        self.election_shed = 0
+
+    def configure(self, votazione_id: str, max_inflight: int | None = None, max_queue: int | None = None):
+        """
+        Imposta i limiti di una votazione (None: valore di default); vale anche per il limitatore già attivo
+        """
+        default_inflight, default_queue = self._election_limits
+        limits = (default_inflight if max_inflight is None else max_inflight,
+                  default_queue if max_queue is None else max_queue)
+        self._overrides[votazione_id] = limits
+        limiter = self._elections.get(votazione_id)
+        if limiter is not None:
+            if limits[0] <= 0:
+                # limite disattivato: le richieste già ammesse rilasciano il vecchio limitatore
+                del self._elections[votazione_id]
+            else:
+                limiter.resize(*limits)
+
+    def forget(self, votazione_id: str):
+        """
+        Votazione conclusa o eliminata: rimuove limiti specifici e limitatore
+        """
+        self._overrides.pop(votazione_id, None)
+        limiter = self._elections.get(votazione_id)
+        if limiter is not None and limiter.idle:
+            del self._elections[votazione_id]
+
+    @asynccontextmanager
+    async def admit(self, votazione_id: str | None = None):
+        """
+        Ammette una richiesta (votazione_id None: solo limite globale); solleva Overloaded se va scartata
+        """
+        limiter = self._election(votazione_id) if votazione_id is not None else None
+        # durata del servizio (per Retry-After) misurata da quando la richiesta ha tutti i posti: l'attesa in coda è esclusa
+        t0 = None
+        if limiter is not None:
+            try:
+                await limiter.acquire("election")
+            except Overloaded:
+                self.election_shed += 1
+                self._discard_idle(votazione_id, limiter)
+                raise
+        try:
+            if self.global_limiter is not None:
+                await self.global_limiter.acquire("global")
+            try:
+                t0 = time.perf_counter()
+                yield
+            finally:
+                if self.global_limiter is not None:
+                    self.global_limiter.release(time.perf_counter() - t0)
+        finally:
+            if limiter is not None:
+                # t0 None: rifiutata dal limite globale, il posto della votazione non è stato usato
+                limiter.release(time.perf_counter() - t0 if t0 is not None else None)
+                self._discard_idle(votazione_id, limiter)
+
+    def inflight(self, scope: str = "global") -> int:
+        if scope == "global":
+            return self.global_limiter.inflight if self.global_limiter else 0
+        return sum(lim.inflight for lim in self._elections.values())
+
+    def queued(self, scope: str = "global") -> int:
+        if scope == "global":
+            return self.global_limiter.queued if self.global_limiter else 0
+        return sum(lim.queued for lim in self._elections.values())
+
+    def shed(self, scope: str = "global") -> int:
+        if scope == "global":
+            return self.global_limiter.shed if self.global_limiter else 0
+        return self.election_shed
+
+    def _election(self, votazione_id: str) -> Limiter | None:
+        limiter = self._elections.get(votazione_id)
+        if limiter is None:
+            max_inflight, max_queue = self._overrides.get(votazione_id, self._election_limits)
+            if max_inflight <= 0:
+                return None
+            self._sweep()
+            limiter = self._elections[votazione_id] = Limiter(max_inflight, max_queue, self.queue_timeout)
+        limiter.idle_since = None
+        return limiter
+
+    def _discard_idle(self, votazione_id: str, limiter: Limiter):
+        if limiter.idle and self._elections.get(votazione_id) is limiter:
+            limiter.idle_since = time.monotonic()
+
+    def _sweep(self):
+        # al più una scansione ogni idle_ttl / 2 secondi, alla creazione di un nuovo limitatore
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.idle_ttl / 2
+        for votazione_id, limiter in list(self._elections.items()):
+            if limiter.idle and limiter.idle_since is not None and now - limiter.idle_since >= self.idle_ttl:
+                del self._elections[votazione_id]
@@ -0,0 +1,86 @@
+# --- ACCESSO ASINCRONO AL DATABASE ---------------------------------------
+# Versioni awaitable delle funzioni di UserFunctions: il client supabase-py è sincrono,
+# quindi ogni chiamata viene eseguita in un pool di thread limitato (DB_POOL_SIZE)
+# invece di bloccare l'event loop (e con esso i submit_vote concorrenti).
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import UserFunctions
+from Config import DB_POOL_SIZE
+
+_executor: ThreadPoolExecutor | None = None
+
+
+async def run(fn, *args, **kwargs):
+    """
+    Esegue fn(*args, **kwargs) nel pool del database e ne attende il risultato
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="supabase")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown():
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def get_admin_ids() -> list[str]:
+    return await run(UserFunctions.get_admin_ids)
+
+async def list_users_page(limit: int, cursor: str | None = None, categoria: str | None = None,
+                          exclude_ids: list[str] | None = None) -> list[dict]:
+    return await run(UserFunctions.list_users_page, limit, cursor, categoria, exclude_ids)
+
+async def count_eligible_users(categoria: str) -> int:
+    return await run(UserFunctions.count_eligible_users, categoria)
+
+async def delete_user(user_id: str):
+    return await run(UserFunctions.delete_user, user_id)
+
+async def delete_users_data(user_ids: list[str]):
+    return await run(UserFunctions.delete_users_data, user_ids)
+
+async def change_categoria(user_id, categoria):
+    return await run(UserFunctions.change_categoria, user_id, categoria)
+
+async def upsert_profiles(rows: list[dict]):
+    return await run(UserFunctions.upsert_profiles, rows)
+
+async def create_auth_user(email: str, password: str, simulation_id: int) -> str:
+    return await run(UserFunctions.create_auth_user, email, password, simulation_id)
+
+async def delete_auth_user(user_id: str):
+    return await run(UserFunctions.delete_auth_user, user_id)
+
+async def list_elections():
+    return await run(UserFunctions.list_elections)
+
+async def insert_election(topic: str, categoria: str):
+    return await run(UserFunctions.insert_election, topic, categoria)
+
+async def update_election(votazione_id: int, yes_total: int, no_total: int, concluded: bool):
+    return await run(UserFunctions.update_election, votazione_id, yes_total, no_total, concluded)
+
+async def get_election(votazione_id: int):
+    return await run(UserFunctions.get_election, votazione_id)
+
+async def get_election_result(votazione_id: int) -> dict:
+    return await run(UserFunctions.get_election_result, votazione_id)
+
+async def get_elections(votazione_ids: list[int]) -> list[dict]:
+    return await run(UserFunctions.get_elections, votazione_ids)
+
+async def delete_election(votazione_id: int):
+    return await run(UserFunctions.delete_election, votazione_id)
+
+async def create_categoria(nome: str):
+    return await run(UserFunctions.create_categoria, nome)
+
+async def get_categorie():
+    return await run(UserFunctions.get_categorie)
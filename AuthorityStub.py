@@ -0,0 +1,166 @@
+# --- AUTHORITY LOCALE ----------------------------------------------------
+# Sostituto del server Authority per test di carico offline: genera una coppia di chiavi Paillier per
+# votazione e espone gli stessi endpoint (elections, elections/decrypt_tally) con gli stessi modelli,
+# più elections/decrypt_tally/batch (più somme in una richiesta) che il server Authority reale non ha.
+# In-process: AUTHORITY_BACKEND=local (il client "auth" usa un httpx.ASGITransport, nessuna rete).
+# Come servizio separato: uvicorn AuthorityStub:app --port 8001 e AUTH_BASE=http://localhost:8001/api/authority/
+# Guasti simulati (ritardi, risposte lente, errori 503) per provare retry, hedging e circuit breaker del client:
+# AUTHORITY_STUB_* all'avvio, oppure a runtime con POST /api/authority/_faults.
+import asyncio
+import hashlib
+import random
+
+from fastapi import APIRouter, FastAPI, HTTPException
+from phe import paillier
+from pydantic import BaseModel
+
+from Config import (AUTHORITY_KEY_BITS, AUTHORITY_STUB_DELAY_MS, AUTHORITY_STUB_SLOW_RATE, AUTHORITY_STUB_SLOW_MS,
+                    AUTHORITY_STUB_ERROR_RATE)
+
+
+class PublicKeyResponse(BaseModel):
+    n: str
+    g: str
+    pk_fingerprint: str
+
+class ElectionKeyModel(BaseModel):
+    votazione_id: int
+
+class DecryptTallyModel(BaseModel):
+    votazione_id: int
+    ciphertext_sum: int
+
+class DecryptTallyResponse(BaseModel):
+    plain_sum: int
+
+class DecryptTallyBatchModel(BaseModel):
+    items: list[DecryptTallyModel]
+
+class DecryptTallyBatchItem(BaseModel):
+    """
+    Esito di una somma del batch: plain_sum, oppure status_code e detail come per decrypt_tally
+    """
+    votazione_id: int
+    plain_sum: int | None = None
+    status_code: int = 200
+    detail: str | None = None
+
+class DecryptTallyBatchResponse(BaseModel):
+    results: list[DecryptTallyBatchItem]
+
+
+class FaultsModel(BaseModel):
+    """
+    Guasti applicati a ogni richiesta: delay_ms sempre, slow_ms in più con probabilità slow_rate,
+    503 con probabilità error_rate (down: sempre 503)
+    """
+    delay_ms: int = AUTHORITY_STUB_DELAY_MS
+    slow_rate: float = AUTHORITY_STUB_SLOW_RATE
+    slow_ms: int = AUTHORITY_STUB_SLOW_MS
+    error_rate: float = AUTHORITY_STUB_ERROR_RATE
+    down: bool = False
+
+
+class AuthorityStub:
+    """
+    Authority in memoria: votazione_id -> (chiave pubblica, chiave privata).
+    La generazione delle chiavi gira in un thread, una sola volta per votazione anche con richieste concorrenti.
+    """
+    def __init__(self, key_bits: int = AUTHORITY_KEY_BITS):
+        self.key_bits = key_bits
+        self.keys: dict[int, tuple[paillier.PaillierPublicKey, paillier.PaillierPrivateKey]] = {}
+        self._pending: dict[int, asyncio.Task] = {}
+        self.faults = FaultsModel()
+        self.requests = 0
+
+        self.router = APIRouter(prefix="/api/authority")
+        self.router.post("/elections")(self.get_public_key)
+        self.router.post("/elections/decrypt_tally")(self.decrypt_tally)
+        self.router.post("/elections/decrypt_tally/batch")(self.decrypt_tally_batch)
+        self.router.post("/_faults")(self.set_faults)
+
+        self.app = FastAPI()
+        self.app.include_router(self.router)
+
+    async def keypair(self, votazione_id: int):
+        if votazione_id in self.keys:
+            return self.keys[votazione_id]
+        task = self._pending.get(votazione_id)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(paillier.generate_paillier_keypair, n_length=self.key_bits))
+            self._pending[votazione_id] = task
+        try:
+            pair = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._pending.pop(votazione_id, None)
+        self.keys[votazione_id] = pair
+        return pair
+
+    async def set_faults(self, body: FaultsModel) -> FaultsModel:
+        """
+        Sostituisce i guasti simulati (tutti i campi; quelli omessi tornano ai valori di Config)
+        """
+        self.faults = body
+        return self.faults
+
+    async def inject_faults(self):
+        self.requests += 1
+        f = self.faults
+        delay = f.delay_ms + (f.slow_ms if f.slow_rate > 0 and random.random() < f.slow_rate else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if f.down or (f.error_rate > 0 and random.random() < f.error_rate):
+            raise HTTPException(status_code=503, detail="Authority non disponibile (guasto simulato)")
+
+    async def get_public_key(self, body: ElectionKeyModel) -> PublicKeyResponse:
+        """
+        Crea (alla prima richiesta) e restituisce la chiave pubblica della votazione
+        """
+        await self.inject_faults()
+        pk, _ = await self.keypair(body.votazione_id)
+        fingerprint = hashlib.sha256(f"{pk.n:x}".encode()).hexdigest()
+        return PublicKeyResponse(n=str(pk.n), g=str(pk.g), pk_fingerprint=fingerprint)
+
+    async def decrypt_tally(self, body: DecryptTallyModel) -> DecryptTallyResponse:
+        """
+        Decifra la somma cifrata dei voti con la chiave privata della votazione
+        """
+        await self.inject_faults()
+        pair = self.keys.get(body.votazione_id)
+        if pair is None:
+            raise HTTPException(status_code=404, detail="Elezione non trovata o non inizializzata")
+        pk, sk = pair
+        if not 0 < body.ciphertext_sum < pk.nsquare:
+            raise HTTPException(status_code=400, detail="Ciphertext fuori dal range della chiave")
+        plain = await asyncio.to_thread(sk.decrypt, paillier.EncryptedNumber(pk, body.ciphertext_sum, 0))
+        return DecryptTallyResponse(plain_sum=plain)
+
+    async def decrypt_tally_batch(self, body: DecryptTallyBatchModel) -> DecryptTallyBatchResponse:
+        """
+        Come decrypt_tally per più votazioni (stesso ordine della richiesta): un solo round trip
+        e tutte le decifrature in un unico thread; gli errori sono riportati per votazione
+        """
+        await self.inject_faults()
+        results: list[DecryptTallyBatchItem] = []
+        todo: list[tuple[DecryptTallyBatchItem, paillier.PaillierPrivateKey, paillier.EncryptedNumber]] = []
+        for item in body.items:
+            res = DecryptTallyBatchItem(votazione_id=item.votazione_id)
+            pair = self.keys.get(item.votazione_id)
+            if pair is None:
+                res.status_code, res.detail = 404, "Elezione non trovata o non inizializzata"
+            elif not 0 < item.ciphertext_sum < pair[0].nsquare:
+                res.status_code, res.detail = 400, "Ciphertext fuori dal range della chiave"
+            else:
+                todo.append((res, pair[1], paillier.EncryptedNumber(pair[0], item.ciphertext_sum, 0)))
+            results.append(res)
+
+        def decrypt_all():
+            for res, sk, enc in todo:
+                res.plain_sum = sk.decrypt(enc)
+
+        await asyncio.to_thread(decrypt_all)
+        return DecryptTallyBatchResponse(results=results)
+
+
+app = AuthorityStub().app
@@ -0,0 +1,168 @@
+import os
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+# --- UPSTREAM ------------------------------------------------------------
+AUTH_BASE = os.getenv("AUTH_BASE", "https://authority-k9w7.onrender.com/api/authority/")
+# "http": Authority raggiungibile su AUTH_BASE; "local": AuthorityStub in-process, senza rete (test di carico)
+AUTHORITY_BACKEND = os.getenv("AUTHORITY_BACKEND", "http").lower()
+# /elections/result/batch decifra tutte le somme con una sola chiamata elections/decrypt_tally/batch:
+# la espone solo AuthorityStub (in-process o come servizio), quindi è attiva di default solo con "local"
+AUTH_BATCH_DECRYPT = os.getenv("AUTH_BATCH_DECRYPT", "1" if AUTHORITY_BACKEND == "local" else "0") == "1"
+# dimensione delle chiavi generate da AuthorityStub
+AUTHORITY_KEY_BITS = int(os.getenv("AUTHORITY_KEY_BITS", "2048"))
+
+# --- AUTHORITY: RESILIENZA -----------------------------------------------
+# timeout del singolo tentativo e tempo massimo complessivo (tentativi e attese incluse) di una chiamata
+AUTH_ATTEMPT_TIMEOUT_S = float(os.getenv("AUTH_ATTEMPT_TIMEOUT_S", "10"))
+AUTH_DEADLINE_S = float(os.getenv("AUTH_DEADLINE_S", "25"))
+# tentativi totali per chiamata; attesa tra i tentativi casuale in [0, base * 2^n], al più AUTH_RETRY_MAX_MS
+AUTH_RETRY_ATTEMPTS = int(os.getenv("AUTH_RETRY_ATTEMPTS", "3"))
+AUTH_RETRY_BASE_MS = int(os.getenv("AUTH_RETRY_BASE_MS", "200"))
+AUTH_RETRY_MAX_MS = int(os.getenv("AUTH_RETRY_MAX_MS", "2000"))
+# seconda richiesta se la prima supera questo percentile delle latenze recenti (0 = nessun hedging)
+AUTH_HEDGE_PERCENTILE = float(os.getenv("AUTH_HEDGE_PERCENTILE", "95"))
+AUTH_HEDGE_MIN_MS = int(os.getenv("AUTH_HEDGE_MIN_MS", "50"))
+# circuit breaker: errori consecutivi che aprono il circuito e secondi prima della richiesta di prova
+AUTH_BREAKER_FAILURES = int(os.getenv("AUTH_BREAKER_FAILURES", "5"))
+AUTH_BREAKER_RESET_S = float(os.getenv("AUTH_BREAKER_RESET_S", "10"))
+# AuthorityStub: guasti simulati (ritardo fisso, frazione di risposte lente e di errori 503)
+AUTHORITY_STUB_DELAY_MS = int(os.getenv("AUTHORITY_STUB_DELAY_MS", "0"))
+AUTHORITY_STUB_SLOW_RATE = float(os.getenv("AUTHORITY_STUB_SLOW_RATE", "0"))
+AUTHORITY_STUB_SLOW_MS = int(os.getenv("AUTHORITY_STUB_SLOW_MS", "0"))
+AUTHORITY_STUB_ERROR_RATE = float(os.getenv("AUTHORITY_STUB_ERROR_RATE", "0"))
+
+# --- CACHE CHIAVI PUBBLICHE ----------------------------------------------
+# numero massimo di chiavi Paillier mantenute in memoria (eviction LRU)
+PK_CACHE_SIZE = int(os.getenv("PK_CACHE_SIZE", "256"))
+
+# --- CLIENT HTTP VERSO GLI UPSTREAM --------------------------------------
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("HTTP_WRITE_TIMEOUT", "10"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+# HTTP/2 viene usato solo se il pacchetto h2 è installato (pip install "httpx[http2]")
+HTTP2 = os.getenv("HTTP2", "1") == "1"
+
+# --- ACCUMULATORE --------------------------------------------------------
+# "file": FileAccumulator (documento JSON unico), "log": LogAccumulator (log append-only a segmenti),
+# "sqlite": SqliteAccumulator (WAL, file condivisibile tra processi; il servizio resta a un solo worker,
+# vedi VotingSystemAPI)
+ACCUMULATOR_BACKEND = os.getenv("ACCUMULATOR_BACKEND", "file").lower()
+# dimensione oltre la quale il segmento attivo del log viene chiuso e ne viene aperto uno nuovo
+LOG_SEGMENT_MAX_BYTES = int(os.getenv("LOG_SEGMENT_MAX_BYTES", str(4 * 1024 * 1024)))
+# numero di segmenti chiusi che fa partire la compattazione in background
+LOG_COMPACT_SEGMENTS = int(os.getenv("LOG_COMPACT_SEGMENTS", "4"))
+LOG_FSYNC = os.getenv("LOG_FSYNC", "1") == "1"
+# group commit: gli aggiornamenti raccolti in questa finestra (o fino a N voti) diventano una sola scrittura
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "3"))
+GROUP_COMMIT_MAX_VOTES = int(os.getenv("GROUP_COMMIT_MAX_VOTES", "256"))
+
+# --- SIMULAZIONI ---------------------------------------------------------
+# "file": SimulationStore (JSON), "sqlite": SqliteSimulationStore
+SIMULATION_BACKEND = os.getenv("SIMULATION_BACKEND", "file").lower()
+# utenti fittizi creati in parallelo durante start_simulation
+SIM_PROVISION_CONCURRENCY = int(os.getenv("SIM_PROVISION_CONCURRENCY", "8"))
+# eliminazioni di utenti auth contemporanee durante la chiusura/rollback di una simulazione
+SIM_TEARDOWN_CONCURRENCY = int(os.getenv("SIM_TEARDOWN_CONCURRENCY", "8"))
+# ogni quanti utenti creati viene salvato un checkpoint nello store delle simulazioni
+SIM_CHECKPOINT_EVERY = int(os.getenv("SIM_CHECKPOINT_EVERY", "10"))
+# processi usati per cifrare i voti delle simulazioni (la cifratura Paillier è CPU-bound)
+SIM_ENCRYPT_WORKERS = int(os.getenv("SIM_ENCRYPT_WORKERS", str(os.cpu_count() or 2)))
+# modalità sintetica (senza utenti auth): numero di ballot ammessi, voti in volo, dimensione dei blocchi
+SIM_SYNTHETIC_MIN = int(os.getenv("SIM_SYNTHETIC_MIN", "10000"))
+SIM_SYNTHETIC_MAX = int(os.getenv("SIM_SYNTHETIC_MAX", "1000000"))
+SIM_SYNTHETIC_CONCURRENCY = int(os.getenv("SIM_SYNTHETIC_CONCURRENCY", "256"))
+SIM_SYNTHETIC_CHUNK = int(os.getenv("SIM_SYNTHETIC_CHUNK", "4096"))
+# offuscatori indipendenti da cui vengono derivati quelli dei ballot sintetici
+SIM_SYNTHETIC_BASE_OBFUSCATORS = int(os.getenv("SIM_SYNTHETIC_BASE_OBFUSCATORS", "64"))
+
+# --- OFFUSCATORI PRECALCOLATI --------------------------------------------
+# scorta di r^n mod n² per chiave: riempita fino a OBF_POOL_SIZE quando scende sotto OBF_POOL_LOW
+OBF_POOL_SIZE = int(os.getenv("OBF_POOL_SIZE", "256"))
+OBF_POOL_LOW = int(os.getenv("OBF_POOL_LOW", "64"))
+OBF_POOL_CHUNK = int(os.getenv("OBF_POOL_CHUNK", "16"))
+
+# --- SQLITE --------------------------------------------------------------
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/aggregator.sqlite3")
+# FULL: ogni commit è durevole anche in caso di crash del sistema; NORMAL: più veloce, durevole solo al checkpoint
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "FULL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# --- ELENCO UTENTI -------------------------------------------------------
+# secondi di validità delle pagine di /elections/users in cache (0 = nessuna cache)
+USERS_CACHE_TTL = float(os.getenv("USERS_CACHE_TTL", "5"))
+USERS_CACHE_SIZE = int(os.getenv("USERS_CACHE_SIZE", "256"))
+# dimensione massima di una pagina (anche il limite di righe per richiesta di PostgREST)
+USERS_PAGE_MAX = int(os.getenv("USERS_PAGE_MAX", "1000"))
+
+# --- LISTE VOTAZIONI / CATEGORIE -----------------------------------------
+# le liste in cache vengono rilette a ogni scrittura fatta da questo processo; il TTL (secondi)
+# copre le scritture fatte da altri client direttamente sul database
+LISTS_CACHE_TTL = float(os.getenv("LISTS_CACHE_TTL", "30"))
+
+# --- RISULTATI ----------------------------------------------------------
+# esiti delle votazioni concluse tenuti in memoria (LRU) per rispondere a get_result senza leggere Supabase
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+# /elections/result/batch: richieste di decifratura contemporanee verso l'Authority
+RESULT_BATCH_CONCURRENCY = int(os.getenv("RESULT_BATCH_CONCURRENCY", "8"))
+# votazioni accettate in una singola richiesta batch
+RESULT_BATCH_MAX = int(os.getenv("RESULT_BATCH_MAX", "500"))
+# scrutinio automatico: se i votanti attesi di una votazione non si possono ricavare (errore o votazione
+# già conclusa) nuovo tentativo non prima di EXPECTED_RETRY_S secondi, invece che a ogni voto
+EXPECTED_RETRY_S = float(os.getenv("EXPECTED_RETRY_S", "30"))
+
+# --- ADMISSION CONTROL ---------------------------------------------------
+# voti elaborati in parallelo dal processo; oltre attendono in coda (al più ADMISSION_MAX_QUEUE),
+# poi vengono rifiutati con 503 + Retry-After (0 = nessun limite)
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "256"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "1024"))
+# stessi limiti per singola votazione, rifiutati con 429 + Retry-After (0 = nessun limite)
+ADMISSION_ELECTION_MAX_INFLIGHT = int(os.getenv("ADMISSION_ELECTION_MAX_INFLIGHT", "128"))
+ADMISSION_ELECTION_MAX_QUEUE = int(os.getenv("ADMISSION_ELECTION_MAX_QUEUE", "512"))
+# i limiti di una singola votazione si possono cambiare alla creazione (admission_max_inflight/_queue);
+# il limitatore di una votazione inattiva viene tenuto ADMISSION_ELECTION_IDLE_TTL_S secondi (stima di Retry-After)
+ADMISSION_ELECTION_IDLE_TTL_S = float(os.getenv("ADMISSION_ELECTION_IDLE_TTL_S", "300"))
+# attesa massima in coda (ms): oltre la richiesta viene rifiutata invece di accumulare latenza
+ADMISSION_QUEUE_TIMEOUT_MS = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000"))
+# voti accettati in una singola richiesta /elections/vote/batch (ogni votazione del batch occupa un posto)
+VOTE_BATCH_MAX = int(os.getenv("VOTE_BATCH_MAX", "1000"))
+
+# --- STREAM SSE ----------------------------------------------------------
+# aggiornamenti del conteggio voti fusi in un solo messaggio per finestra (ms) a ciascun client
+SSE_COALESCE_MS = int(os.getenv("SSE_COALESCE_MS", "250"))
+# commento ": ping" inviato dopo SSE_HEARTBEAT_S secondi senza aggiornamenti (tiene aperti proxy e load balancer)
+SSE_HEARTBEAT_S = float(os.getenv("SSE_HEARTBEAT_S", "15"))
+# durata massima di uno stream: poi il server lo chiude e il client EventSource si riconnette da solo
+SSE_MAX_DURATION_S = float(os.getenv("SSE_MAX_DURATION_S", "300"))
+
+# --- METRICHE ------------------------------------------------------------
+# votazioni con serie proprie in /metrics (voti accettati/rifiutati): solo votazioni aperte note al processo,
+# al più METRICS_ELECTION_SERIES_MAX; le altre sono conteggiate con votazione_id="other"
+METRICS_ELECTION_SERIES_MAX = int(os.getenv("METRICS_ELECTION_SERIES_MAX", "200"))
+
+# --- LOGGING -------------------------------------------------------------
+LOG_FILE = os.getenv("LOG_FILE", "python_logs.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text": "data - messaggio" come in passato; "json": una riga JSON per record (campi extra inclusi)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# rotazione per dimensione: LOG_BACKUP_COUNT file da LOG_MAX_BYTES
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# record in attesa di scrittura; oltre vengono scartati per non bloccare l'event loop
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# frazione dei messaggi per singolo voto che viene scritta (1 = tutti)
+LOG_VOTE_SAMPLE_RATE = float(os.getenv("LOG_VOTE_SAMPLE_RATE", "0.01"))
+
+# --- SUPABASE ------------------------------------------------------------
+# "supabase": client reale (SUPABASE_URL, SUPABASE_SERVICE_ROLE); "memory": MemorySupabase in-process
+SUPABASE_BACKEND = os.getenv("SUPABASE_BACKEND", "supabase").lower()
+# backend "memory": JSON {tabella: [righe]} con i dati iniziali (categorie, profili, ruoli, ...)
+SUPABASE_MEMORY_SEED = os.getenv("SUPABASE_MEMORY_SEED")
+# thread usati per eseguire le chiamate sincrone di supabase-py fuori dall'event loop
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
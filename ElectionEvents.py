@@ -0,0 +1,74 @@
+# --- ELECTION EVENTS -----------------------------------------------------
+# Pub/sub in-process dello stato delle votazioni (voti accumulati, esito finale) per gli stream SSE.
+# Per ogni votazione viene tenuto solo l'ultimo stato: un burst di voti produce al più un messaggio
+# per finestra di coalescenza a ciascun iscritto, indipendentemente dal numero di voti arrivati.
+import asyncio
+
+
+class _Topic:
+    __slots__ = ("state", "version", "changed", "subscribers")
+
+    def __init__(self, state: dict):
+        self.state = state
+        self.version = 1
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+
+
+class ElectionEvents:
+    """
+    publish() costa un lookup se nessuno è iscritto alla votazione; gli iscritti leggono lo stato più
+    recente al risveglio, quindi gli aggiornamenti intermedi vengono fusi (coalescenza).
+      - coalesce_window: secondi di attesa dopo un risveglio per raccogliere gli aggiornamenti successivi
+    """
+    def __init__(self, coalesce_window: float = 0.25):
+        self.coalesce_window = coalesce_window
+        self._topics: dict[str, _Topic] = {}
+
+    def publish(self, votazione_id: str, **fields):
+        topic = self._topics.get(votazione_id)
+        if topic is None:
+            return
+        topic.state = {**topic.state, **fields}
+        topic.version += 1
+        # risveglia gli iscritti in attesa; chi arriva dopo attende il nuovo Event
+        topic.changed.set()
+        topic.changed = asyncio.Event()
+
+    def state(self, votazione_id: str) -> dict | None:
+        topic = self._topics.get(votazione_id)
+        return topic.state if topic else None
+
+    def subscribers(self, votazione_id: str | None = None) -> int:
+        if votazione_id is not None:
+            topic = self._topics.get(votazione_id)
+            return topic.subscribers if topic else 0
+        return sum(t.subscribers for t in self._topics.values())
+
+    async def subscribe(self, votazione_id: str, initial: dict, heartbeat: float):
+        """
+        Generatore asincrono: emette subito lo stato corrente (initial se nessuno lo conosceva già),
+        poi lo stato aggiornato a ogni cambiamento; None ogni heartbeat secondi senza cambiamenti.
+        """
+        topic = self._topics.get(votazione_id)
+        if topic is None:
+            topic = self._topics[votazione_id] = _Topic(initial)
+        topic.subscribers += 1
+        try:
+            seen = topic.version
+            yield topic.state
+            while True:
+                if topic.version == seen:
+                    try:
+                        await asyncio.wait_for(topic.changed.wait(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield None
+                        continue
+                    if self.coalesce_window > 0:
+                        await asyncio.sleep(self.coalesce_window)
+                seen = topic.version
+                yield topic.state
+        finally:
+            topic.subscribers -= 1
+            if topic.subscribers == 0 and self._topics.get(votazione_id) is topic:
+                del self._topics[votazione_id]
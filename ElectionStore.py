@@ -0,0 +1,80 @@
+import json, os, sqlite3, threading
+
+class ElectionStore:
+    """
+    Metadati delle votazioni aperte usati dallo scrutinio automatico: {votazione_id(str): {num_utenti, categoria}}.
+    Il file JSON viene letto una sola volta e tenuto in memoria: get() non fa I/O, set()/pop() riscrivono
+    il file in modo atomico (tmp + replace). Pensato per un singolo processo, come il servizio (vedi VotingSystemAPI).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._data = data if isinstance(data, dict) else {}
+        except (FileNotFoundError, ValueError):
+            self._data = {}
+
+    def _write(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def get(self, votazione_id):
+        with self._lock:
+            meta = self._data.get(str(votazione_id))
+            return dict(meta) if meta is not None else None
+
+    def set(self, votazione_id, meta: dict) -> None:
+        with self._lock:
+            self._data[str(votazione_id)] = dict(meta)
+            self._write()
+
+    def pop(self, votazione_id):
+        with self._lock:
+            meta = self._data.pop(str(votazione_id), None)
+            if meta is not None:
+                self._write()
+            return meta
+
+
+class SqliteElectionStore:
+    """
+    Versione SQLite (WAL) di ElectionStore, condivisa tra più processi (tabella election_meta nel file SQLITE_PATH)
+    """
+    def __init__(self, path: str, synchronous: str = "FULL", busy_timeout_ms: int = 5000):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn().execute("CREATE TABLE IF NOT EXISTS election_meta (id TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, votazione_id):
+        row = self._conn().execute("SELECT payload FROM election_meta WHERE id = ?", (str(votazione_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, votazione_id, meta: dict) -> None:
+        self._conn().execute(
+            "INSERT INTO election_meta (id, payload) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET payload = excluded.payload",
+            (str(votazione_id), json.dumps(meta, ensure_ascii=False)),
+        )
+
+    def pop(self, votazione_id):
+        row = self._conn().execute("DELETE FROM election_meta WHERE id = ? RETURNING payload",
+                                   (str(votazione_id),)).fetchone()
+        return json.loads(row[0]) if row else None
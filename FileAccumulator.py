@@ -55,6 +55,20 @@ class FileAccumulator:
         self._atomic_write(data)
         return
 
+    def set_many(self, updates: dict[str, tuple[int, int, int] | None]):
+        """
+        Applica più aggiornamenti con un'unica riscrittura del file (None = clear).
+        """
+        data = self._read()
+        elections = data.setdefault("elections", {})
+        for election_id, rec in updates.items():
+            if rec is None:
+                elections.pop(election_id, None)
+            else:
+                c, exp, count = rec
+                elections[election_id] = {"c": str(c), "exp": int(exp), "count": int(count)}
+        self._atomic_write(data)
+
     def clear(self, election_id: str):
         data = self._read()
         if election_id in data.get("elections", {}):
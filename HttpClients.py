@@ -0,0 +1,55 @@
+# --- CLIENT HTTP CONDIVISI -----------------------------------------------
+import importlib.util
+import httpx
+
+from Config import (HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY, HTTP_CONNECT_TIMEOUT,
+                    HTTP_READ_TIMEOUT, HTTP_WRITE_TIMEOUT, HTTP_POOL_TIMEOUT, HTTP2)
+
+
+class UpstreamClients:
+    """
+    Mantiene un httpx.AsyncClient a lunga vita per ogni upstream, con keep-alive e pool di connessioni:
+      - auth: server Authority (AUTH_BASE)
+    I client vengono creati al primo utilizzo (o all'avvio dell'app) e chiusi con aclose().
+    transports permette di sostituire la rete per un upstream (es. {"auth": httpx.ASGITransport(...)}).
+    """
+    def __init__(self, auth_base: str, transports: dict[str, httpx.AsyncBaseTransport] | None = None):
+        self._bases = {"auth": auth_base}
+        self._transports = transports or {}
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self.http2 = HTTP2 and importlib.util.find_spec("h2") is not None
+
+    @property
+    def auth(self) -> httpx.AsyncClient:
+        return self._client("auth")
+
+    def start(self):
+        for name in self._bases:
+            self._client(name)
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def _client(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self._bases[name],
+                http2=self.http2,
+                transport=self._transports.get(name),
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    connect=HTTP_CONNECT_TIMEOUT,
+                    read=HTTP_READ_TIMEOUT,
+                    write=HTTP_WRITE_TIMEOUT,
+                    pool=HTTP_POOL_TIMEOUT,
+                ),
+            )
+            self._clients[name] = client
+        return client
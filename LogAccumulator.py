@@ -0,0 +1,237 @@
+# --- LOG ACCUMULATOR -----------------------------------------------------
+import json, logging, os, threading
+from pathlib import Path
+
+
+class LogAccumulator:
+    """
+    Alternativa a FileAccumulator con la stessa API (get/set/clear), basata su un log append-only a segmenti.
+    Ogni set/clear aggiunge una sola riga JSON compatta al segmento attivo, invece di riscrivere tutto il file:
+      {"id": "<id>", "c": "<hex>", "exp": 0, "count": 7}   aggiornamento dell'accumulatore
+      {"id": "<id>", "del": 1}                             votazione rimossa
+      {"base": 1}                                          inizio di uno snapshot (stato azzerato)
+    Lo stato corrente è mantenuto in memoria e ricostruito all'avvio rileggendo i segmenti in ordine.
+    Quando i segmenti chiusi superano la soglia, un thread in background li compatta in un unico snapshot.
+    """
+    SEGMENT_GLOB = "seg-*.log"
+
+    def __init__(self, path: str, segment_max_bytes: int = 4 * 1024 * 1024, compact_segments: int = 4,
+                 fsync: bool = True):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_segments = max(1, compact_segments)
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._state: dict[str, tuple[int, int, int]] = {}
+        self._compacting = False
+        self._compact_event = threading.Event()
+        self._stop = threading.Event()
+        self._closed = False
+
+        for tmp in self.path.glob("seg-*.tmp"):
+            tmp.unlink(missing_ok=True)
+        segments = self._segments()
+        for i, seg in enumerate(segments):
+            self._replay(seg, last=i == len(segments) - 1)
+
+        self._active_no = (self._segment_no(segments[-1]) + 1) if segments else 1
+        self._active = self._open_segment(self._active_no)
+
+        self._compactor = threading.Thread(target=self._compact_loop, name="log-accumulator-compactor", daemon=True)
+        self._compactor.start()
+
+    # ---------------------------------------------------------------------
+    # API (compatibile con FileAccumulator)
+    # ---------------------------------------------------------------------
+
+    def get(self, election_id: str) -> tuple[int, int, int] | None:
+        """
+        Ritorna (c, exp, count) oppure None se non c'è ancora accumulato.
+        """
+        with self._lock:
+            return self._state.get(election_id)
+
+    def set(self, election_id: str, c: int, exp: int, count: int):
+        rec = {"id": election_id, "c": format(int(c), "x"), "exp": int(exp), "count": int(count)}
+        with self._lock:
+            self._append(rec)
+            self._state[election_id] = (int(c), int(exp), int(count))
+
+    def clear(self, election_id: str):
+        with self._lock:
+            if election_id not in self._state:
+                return
+            self._append({"id": election_id, "del": 1})
+            del self._state[election_id]
+
+    def set_many(self, updates: dict[str, tuple[int, int, int] | None]):
+        """
+        Aggiunge al log un record per ogni aggiornamento (None = clear) con un solo fsync finale.
+        """
+        with self._lock:
+            for election_id, rec in updates.items():
+                if rec is None:
+                    if election_id in self._state:
+                        self._active.write(self._encode({"id": election_id, "del": 1}))
+                else:
+                    c, exp, count = rec
+                    self._active.write(self._encode(
+                        {"id": election_id, "c": format(int(c), "x"), "exp": int(exp), "count": int(count)}))
+            self._active.flush()
+            if self.fsync:
+                os.fsync(self._active.fileno())
+            for election_id, rec in updates.items():
+                if rec is None:
+                    self._state.pop(election_id, None)
+                else:
+                    c, exp, count = rec
+                    self._state[election_id] = (int(c), int(exp), int(count))
+            if self._active.tell() >= self.segment_max_bytes:
+                self._rotate()
+
+    def close(self):
+        self._closed = True
+        self._stop.set()
+        self._compact_event.set()
+        self._compactor.join(timeout=5)
+        with self._lock:
+            self._active.close()
+
+    # ---------------------------------------------------------------------
+    # SEGMENTI
+    # ---------------------------------------------------------------------
+
+    def _segments(self) -> list[Path]:
+        return sorted(self.path.glob(self.SEGMENT_GLOB), key=self._segment_no)
+
+    @staticmethod
+    def _segment_no(seg: Path) -> int:
+        return int(seg.stem.split("-", 1)[1])
+
+    def _segment_path(self, no: int) -> Path:
+        return self.path / f"seg-{no:08d}.log"
+
+    def _open_segment(self, no: int):
+        f = self._segment_path(no).open("ab")
+        self._fsync_dir()
+        return f
+
+    def _append(self, rec: dict):
+        # chiamato con self._lock acquisito
+        self._active.write(self._encode(rec))
+        self._active.flush()
+        if self.fsync:
+            os.fsync(self._active.fileno())
+        if self._active.tell() >= self.segment_max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        # chiamato con self._lock acquisito
+        self._active.close()
+        self._active_no += 1
+        self._active = self._open_segment(self._active_no)
+        if len(self._segments()) - 1 >= self.compact_segments:
+            self._compact_event.set()
+
+    def _replay(self, seg: Path, last: bool):
+        """
+        Riapplica i record del segmento. È tollerata solo l'ultima riga troncata (senza "\n") dell'ultimo segmento,
+        lasciata da una scrittura interrotta: viene rimossa dal file, così dopo il riavvio non resta in mezzo al log.
+        Qualsiasi altro record illeggibile è una corruzione: saltarlo darebbe un accumulatore sbagliato.
+        """
+        valid_bytes = 0
+        truncated = False
+        with seg.open("rb") as f:
+            for lineno, line in enumerate(f, 1):
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    if last and not line.endswith(b"\n"):
+                        truncated = True
+                        break
+                    logging.error("Log accumulatori corrotto: %s, riga %d non leggibile", seg, lineno)
+                    raise ValueError(f"Segmento {seg.name} corrotto alla riga {lineno}")
+                valid_bytes += len(line)
+                if rec.get("base"):
+                    self._state.clear()
+                elif rec.get("del"):
+                    self._state.pop(rec["id"], None)
+                else:
+                    self._state[rec["id"]] = (int(rec["c"], 16), int(rec.get("exp", 0)), int(rec.get("count", 0)))
+        if truncated:
+            logging.warning("Log accumulatori: rimossa l'ultima riga troncata di %s", seg)
+            os.truncate(seg, valid_bytes)
+
+    @staticmethod
+    def _encode(rec: dict) -> bytes:
+        return (json.dumps(rec, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def _fsync_dir(self):
+        if not self.fsync or os.name != "posix":
+            return
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ---------------------------------------------------------------------
+    # COMPATTAZIONE
+    # ---------------------------------------------------------------------
+
+    COMPACT_BACKOFF_MAX = 60.0
+
+    def _compact_loop(self):
+        backoff = 1.0
+        while True:
+            self._compact_event.wait()
+            self._compact_event.clear()
+            if self._closed:
+                return
+            try:
+                self.compact()
+                backoff = 1.0
+            except Exception:
+                # i segmenti restano validi: attendo (backoff esponenziale) e ritento, senza ripetere a vuoto
+                # ad ogni rotazione un errore persistente (es. disco pieno)
+                logging.exception("Compattazione di %s fallita, nuovo tentativo tra %.0fs", self.path, backoff)
+                if self._stop.wait(backoff):
+                    return
+                backoff = min(backoff * 2, self.COMPACT_BACKOFF_MAX)
+                self._compact_event.set()
+
+    def compact(self):
+        """
+        Riscrive lo stato corrente in un segmento snapshot ed elimina i segmenti precedenti.
+        Le scritture concorrenti proseguono su un nuovo segmento successivo allo snapshot.
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            snapshot = dict(self._state)
+            old = [seg for seg in self._segments() if self._segment_no(seg) <= self._active_no]
+            # numerazione: ... old | snapshot (N+1) | nuovo attivo (N+2)
+            snap_no = self._active_no + 1
+            self._active.close()
+            self._active_no += 2
+            self._active = self._open_segment(self._active_no)
+
+        try:
+            snap = self._segment_path(snap_no)
+            tmp = snap.with_suffix(".tmp")
+            with tmp.open("wb") as f:
+                f.write(self._encode({"base": 1}))
+                for election_id, (c, exp, count) in snapshot.items():
+                    f.write(self._encode({"id": election_id, "c": format(c, "x"), "exp": exp, "count": count}))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, snap)
+            self._fsync_dir()
+            for seg in old:
+                seg.unlink(missing_ok=True)
+        finally:
+            with self._lock:
+                self._compacting = False
@@ -0,0 +1,118 @@
+# --- LOGGING -------------------------------------------------------------
+# Logging non bloccante: i record vengono messi in una coda (QueueHandler) e scritti su file da un thread
+# di background (QueueListener) con rotazione per dimensione. L'event loop non tocca mai il disco:
+# se il volume dei log si blocca e la coda si riempie, i record in eccesso vengono scartati e contati.
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+
+from Config import (LOG_FILE, LOG_LEVEL, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE,
+                    LOG_VOTE_SAMPLE_RATE)
+
+# logger dei messaggi emessi per ogni voto, soggetti a campionamento (LOG_VOTE_SAMPLE_RATE)
+VOTE_LOGGER = "aggregator.vote"
+
+# attributi standard di LogRecord: tutto il resto (passato con extra={...}) finisce nei campi JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Una riga JSON per record: ts, level, logger, msg, gli eventuali campi extra ed exc_info
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in vars(record).items():
+            if k not in _RECORD_ATTRS and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lascia passare circa rate * 100% dei record (rate = 1 li tiene tutti, 0 nessuno)
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler su coda limitata che non blocca mai il chiamante: con la coda piena il record viene scartato
+    """
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LogState:
+    def __init__(self):
+        self.handler: DroppingQueueHandler | None = None
+        self.listener: logging.handlers.QueueListener | None = None
+        self.file_handler: logging.Handler | None = None
+
+
+_state = _LogState()
+
+
+def setup_logging():
+    """
+    Configura il root logger (una sola volta) e avvia il thread di scrittura
+    """
+    if _state.handler is None:
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True)
+        if LOG_FORMAT == "json":
+            file_handler.setFormatter(JsonFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+
+        handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(handler)
+        logging.getLogger(VOTE_LOGGER).addFilter(SamplingFilter(LOG_VOTE_SAMPLE_RATE))
+
+        _state.handler, _state.file_handler = handler, file_handler
+    start_logging()
+
+
+def start_logging():
+    if _state.handler is not None and _state.listener is None:
+        _state.listener = logging.handlers.QueueListener(_state.handler.queue, _state.file_handler,
+                                                         respect_handler_level=True)
+        _state.listener.start()
+
+
+def stop_logging():
+    """
+    Scrive i record ancora in coda e ferma il thread (shutdown dell'app)
+    """
+    listener, _state.listener = _state.listener, None
+    if listener is not None:
+        listener.stop()
+        _state.file_handler.flush()
+
+
+def dropped_records() -> int:
+    return _state.handler.dropped if _state.handler is not None else 0
@@ -0,0 +1,221 @@
+# --- MEMORY ACCUMULATOR --------------------------------------------------
+import asyncio
+import logging
+
+
+class MemoryAccumulator:
+    """
+    Mantiene gli accumulatori in memoria, con un asyncio.Lock per ogni election_id, sopra un backend
+    durevole (FileAccumulator / LogAccumulator) che espone get/set_many.
+    La persistenza è a group-commit: gli aggiornamenti arrivati in una finestra breve (commit_window
+    secondi) o fino a commit_max voti vengono scritti con un'unica chiamata set_many.
+    update()/clear() ritornano solo quando il batch che li contiene è durevole; get() restituisce solo
+    totali già durevoli (un crash non può far perdere voti che sono già stati mostrati).
+    Se il backend è condiviso tra processi (store.transactional, es. SqliteAccumulator) non viene tenuta
+    alcuna copia in memoria: ogni update è una transazione del backend (store.update).
+    """
+    def __init__(self, store, commit_window: float = 0.003, commit_max: int = 256):
+        self.store = store
+        self.transactional = getattr(store, "transactional", False)
+        self.commit_window = commit_window
+        self.commit_max = max(1, commit_max)
+
+        # stato di lavoro (anche non ancora scritto), usato da update(): election_id -> (c, exp, count)
+        self._state: dict[str, tuple[int, int, int]] = {}
+        # ultimo stato durevole, servito da get(); le votazioni senza voti non vi compaiono
+        self._committed: dict[str, tuple[int, int, int]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+        # aggiornamenti non ancora scritti e relativi voti in attesa di conferma
+        self._pending: dict[str, tuple[int, int, int] | None] = {}
+        self._waiters: dict[str, list[asyncio.Future]] = {}
+        self._pending_votes = 0
+        # batch in scrittura durante set_many
+        self._flushing: dict[str, tuple[int, int, int] | None] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._full: asyncio.Event | None = None
+        self._writer: asyncio.Task | None = None
+        self._closing = False
+        self._count_task: asyncio.Future | None = None
+        self._last_count = 0
+
+    # ---------------------------------------------------------------------
+    # API
+    # ---------------------------------------------------------------------
+
+    def lock(self, election_id: str) -> asyncio.Lock:
+        lock = self._locks.get(election_id)
+        if lock is None:
+            lock = self._locks[election_id] = asyncio.Lock()
+        return lock
+
+    async def get(self, election_id: str) -> tuple[int, int, int] | None:
+        """
+        Ritorna (c, exp, count) oppure None se non c'è ancora accumulato.
+        """
+        if self.transactional:
+            return await asyncio.to_thread(self.store.get, election_id)
+        rec = self._committed.get(election_id)
+        if rec is not None:
+            return rec
+        if election_id in self._state or election_id in self._pending or election_id in self._flushing:
+            # voti in memoria ma nessuno ancora durevole (oppure votazione appena svuotata)
+            return None
+        # votazione mai letta: dal backend, senza tenere in memoria le votazioni senza voti
+        async with self.lock(election_id):
+            return await self._load(election_id)
+
+    async def update(self, election_id: str, fn) -> tuple[int, int, int]:
+        """
+        Aggiorna l'accumulatore in modo atomico rispetto agli altri voti della stessa votazione.
+        fn(current) riceve (c, exp, count) oppure None e ritorna il nuovo (c, exp, count).
+        """
+        async with self.lock(election_id):
+            if self.transactional:
+                return await asyncio.to_thread(self.store.update, election_id, fn)
+            current = await self._load(election_id)
+            new = fn(current)
+            self._state[election_id] = new
+            durable = self._stage(election_id, new)
+        # il lock viene rilasciato prima dell'attesa: i voti successivi finiscono nello stesso batch
+        await durable
+        return new
+
+    async def clear(self, election_id: str):
+        if self.transactional:
+            await asyncio.to_thread(self.store.clear, election_id)
+            return
+        async with self.lock(election_id):
+            self._state.pop(election_id, None)
+            durable = self._stage(election_id, None)
+        await durable
+
+    def open_count(self) -> int:
+        if self.transactional:
+            return self._store_count()
+        return len(self._committed)
+
+    def _store_count(self) -> int:
+        # backend condiviso: la query di conteggio gira in un thread, fuori dall'event loop;
+        # viene restituito l'ultimo valore disponibile (aggiornato a ogni chiamata)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self.store.count()
+        if self._count_task is None or self._count_task.done():
+            self._count_task = asyncio.ensure_future(asyncio.to_thread(self.store.count))
+            self._count_task.add_done_callback(self._counted)
+        return self._last_count
+
+    def _counted(self, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is None:
+            self._last_count = task.result()
+
+    async def start(self):
+        self._ensure_writer()
+
+    async def stop(self):
+        """
+        Scrive gli aggiornamenti ancora in coda e ferma il writer.
+        """
+        if self._writer is None or self._writer.done():
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await self._writer
+        finally:
+            self._writer = None
+            self._closing = False
+
+    # ---------------------------------------------------------------------
+    # GROUP COMMIT
+    # ---------------------------------------------------------------------
+
+    async def _load(self, election_id: str):
+        # chiamato con il lock della votazione acquisito. Un clear() in coda o in scrittura vale None:
+        # il backend contiene ancora il vecchio accumulatore
+        if election_id in self._state:
+            return self._state[election_id]
+        for staged in (self._pending, self._flushing):
+            if election_id in staged:
+                return staged[election_id]
+        rec = await asyncio.to_thread(self.store.get, election_id)
+        if rec is not None and election_id not in self._state:
+            self._state[election_id] = rec
+            self._committed[election_id] = rec
+        return rec
+
+    def _ensure_writer(self):
+        if self._writer is None or self._writer.done():
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._writer = asyncio.create_task(self._writer_loop())
+            if self._pending:
+                self._wakeup.set()
+
+    def _stage(self, election_id: str, rec) -> asyncio.Future:
+        self._ensure_writer()
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[election_id] = rec
+        self._waiters.setdefault(election_id, []).append(fut)
+        self._pending_votes += 1
+        self._wakeup.set()
+        if self._pending_votes >= self.commit_max:
+            self._full.set()
+        return fut
+
+    async def _writer_loop(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._closing and self._pending_votes < self.commit_max:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.commit_window)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._full.clear()
+            await self._flush()
+            if self._closing and not self._pending:
+                return
+
+    async def _flush(self):
+        batch, waiters = self._pending, self._waiters
+        self._pending, self._waiters, self._pending_votes = {}, {}, 0
+        if not batch:
+            return
+        self._flushing = batch
+        try:
+            await asyncio.to_thread(self.store.set_many, batch)
+        except Exception as e:
+            self._flushing = {}
+            logging.info("Group commit fallito per %d votazioni: %s", len(batch), e)
+            self._discard(batch, e)
+            for futs in waiters.values():
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_exception(e)
+            return
+        self._flushing = {}
+        for election_id, rec in batch.items():
+            if rec is None:
+                self._committed.pop(election_id, None)
+            else:
+                self._committed[election_id] = rec
+        for futs in waiters.values():
+            for fut in futs:
+                if not fut.done():
+                    fut.set_result(None)
+
+    def _discard(self, batch: dict, error: Exception):
+        # lo stato in memoria è più avanti del disco: lo scarto e verrà ricaricato dal backend.
+        # Gli aggiornamenti in coda per le stesse votazioni derivano dal batch fallito e vengono rifiutati.
+        for election_id in batch:
+            self._state.pop(election_id, None)
+            if election_id in self._pending:
+                del self._pending[election_id]
+                futs = self._waiters.pop(election_id, [])
+                self._pending_votes -= len(futs)
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_exception(error)
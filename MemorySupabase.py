@@ -0,0 +1,275 @@
+# --- SUPABASE IN MEMORIA -------------------------------------------------
+# Sostituto in-process del client supabase-py per test di carico offline (SUPABASE_BACKEND=memory):
+# implementa il sottoinsieme del query builder usato da UserFunctions (table().select/insert/update/
+# upsert/delete, filtri eq/neq/in_/gt/gte/lt/lte/ilike/not_, order, limit, range, single) e auth.admin.
+import copy
+import json
+import re
+import threading
+import uuid
+
+
+class MemoryAPIError(Exception):
+    """
+    Errore equivalente a postgrest.APIError (es. single() senza esattamente una riga)
+    """
+
+
+class MemoryResponse:
+    def __init__(self, data, count: int | None = None):
+        self.data = data
+        self.count = count
+
+
+class _User:
+    def __init__(self, user_id: str, email: str, user_metadata: dict):
+        self.id = user_id
+        self.email = email
+        self.user_metadata = user_metadata
+
+
+class _UserResponse:
+    def __init__(self, user: _User):
+        self.user = user
+
+
+class _AuthAdmin:
+    def __init__(self, db: "MemorySupabase"):
+        self._db = db
+
+    def create_user(self, attributes: dict) -> _UserResponse:
+        email = attributes.get("email")
+        with self._db.lock:
+            if any(u.email == email for u in self._db.users.values()):
+                raise MemoryAPIError(f"Utente già registrato: {email}")
+            user = _User(str(uuid.uuid4()), email, dict(attributes.get("user_metadata") or {}))
+            self._db.users[user.id] = user
+        return _UserResponse(user)
+
+    def delete_user(self, user_id: str):
+        with self._db.lock:
+            if self._db.users.pop(str(user_id), None) is None:
+                raise MemoryAPIError(f"Utente non trovato: {user_id}")
+
+
+class _Auth:
+    def __init__(self, db: "MemorySupabase"):
+        self.admin = _AuthAdmin(db)
+
+
+class _Query:
+    """
+    Query builder di una tabella: accumula operazione e filtri, execute() li applica sotto il lock del db.
+    """
+    def __init__(self, db: "MemorySupabase", table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns: list[str] | None = None
+        self._payload = None
+        self._on_conflict = "id"
+        self._filters = []
+        self._negate = False
+        self._order: list[tuple[str, bool]] = []
+        self._offset = 0
+        self._limit: int | None = None
+        self._single = None  # "single" | "maybe"
+        self._count = False
+        self._head = False
+
+    # --- operazioni ------------------------------------------------------
+
+    def select(self, *columns: str, count: str | None = None, head: bool | None = None):
+        cols = [c.strip() for part in columns for c in part.split(",") if c.strip()]
+        self._columns = None if not cols or cols == ["*"] else cols
+        self._count = count is not None
+        self._head = bool(head)
+        return self
+
+    def insert(self, rows):
+        self._op, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", **_):
+        self._op, self._payload, self._on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, values: dict):
+        self._op, self._payload = "update", values
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # --- filtri ----------------------------------------------------------
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def _filter(self, test):
+        negate, self._negate = self._negate, False
+        self._filters.append((lambda row: not test(row)) if negate else test)
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter(lambda row: _same(row.get(column), value))
+
+    def neq(self, column: str, value):
+        return self._filter(lambda row: not _same(row.get(column), value))
+
+    def in_(self, column: str, values):
+        values = list(values)
+        return self._filter(lambda row: any(_same(row.get(column), v) for v in values))
+
+    def gt(self, column: str, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) > value)
+
+    def gte(self, column: str, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) >= value)
+
+    def lt(self, column: str, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) < value)
+
+    def lte(self, column: str, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) <= value)
+
+    def ilike(self, column: str, pattern: str):
+        regex = re.compile("^" + ".*".join(re.escape(part) for part in pattern.split("%")) + "$", re.IGNORECASE | re.DOTALL)
+        return self._filter(lambda row: row.get(column) is not None and bool(regex.match(str(row.get(column)))))
+
+    def is_(self, column: str, value):
+        if value in (None, "null"):
+            return self._filter(lambda row: row.get(column) is None)
+        return self._filter(lambda row: row.get(column) == value)
+
+    # --- modificatori ----------------------------------------------------
+
+    def order(self, column: str, desc: bool = False, **_):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **_):
+        self._limit = size
+        return self
+
+    def offset(self, size: int):
+        self._offset = size
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self._single = "single"
+        return self
+
+    def maybe_single(self):
+        self._single = "maybe"
+        return self
+
+    # --- esecuzione ------------------------------------------------------
+
+    def execute(self) -> MemoryResponse:
+        with self._db.lock:
+            rows = self._db.tables.setdefault(self._table, [])
+            if self._op == "insert":
+                data = [self._db._insert(self._table, r) for r in _as_list(self._payload)]
+            elif self._op == "upsert":
+                data = [self._db._upsert(self._table, r, self._on_conflict) for r in _as_list(self._payload)]
+            else:
+                matched = [r for r in rows if all(f(r) for f in self._filters)]
+                if self._op == "update":
+                    for r in matched:
+                        r.update(self._payload)
+                elif self._op == "delete":
+                    ids = {id(r) for r in matched}
+                    rows[:] = [r for r in rows if id(r) not in ids]
+                data = matched
+            total = len(data)
+            data = [] if self._head else self._shape(data)
+            data = copy.deepcopy(data)
+
+        if self._single is not None:
+            if len(data) == 1:
+                return MemoryResponse(data[0], total if self._count else None)
+            if self._single == "maybe" and not data:
+                return None
+            raise MemoryAPIError(f"JSON object requested, multiple (or no) rows returned ({len(data)})")
+        return MemoryResponse(data, total if self._count else None)
+
+    def _shape(self, data: list[dict]) -> list[dict]:
+        for column, desc in reversed(self._order):
+            data = sorted(data, key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        if self._offset or self._limit is not None:
+            end = None if self._limit is None else self._offset + self._limit
+            data = data[self._offset:end]
+        if self._columns is not None:
+            data = [{c: r.get(c) for c in self._columns} for r in data]
+        return data
+
+
+class MemorySupabase:
+    """
+    Database in memoria con la stessa interfaccia (sincrona) del client supabase-py usata dal progetto.
+    Le tabelle sono liste di dict; le righe inserite senza 'id' ricevono un id intero progressivo.
+    Thread-safe: le chiamate arrivano dal ThreadPoolExecutor di AsyncUserFunctions.
+    """
+    def __init__(self, tables: dict[str, list[dict]] | None = None):
+        self.lock = threading.RLock()
+        self.tables: dict[str, list[dict]] = {}
+        self.users: dict[str, _User] = {}
+        self._seq: dict[str, int] = {}
+        self.auth = _Auth(self)
+        for table, rows in (tables or {}).items():
+            for row in rows:
+                self._insert(table, row)
+
+    @classmethod
+    def from_seed_file(cls, path: str | None) -> "MemorySupabase":
+        """
+        Crea il database caricando le righe iniziali da un JSON {tabella: [righe]} (se path è indicato)
+        """
+        if not path:
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def from_(self, name: str) -> _Query:
+        return self.table(name)
+
+    # chiamati con il lock acquisito
+    def _insert(self, table: str, row: dict) -> dict:
+        row = dict(row)
+        if "id" not in row:
+            self._seq[table] = self._seq.get(table, 0) + 1
+            row["id"] = self._seq[table]
+        elif isinstance(row["id"], int):
+            self._seq[table] = max(self._seq.get(table, 0), row["id"])
+        self.tables.setdefault(table, []).append(row)
+        return row
+
+    def _upsert(self, table: str, row: dict, on_conflict: str) -> dict:
+        keys = [k.strip() for k in on_conflict.split(",")]
+        for existing in self.tables.setdefault(table, []):
+            if all(_same(existing.get(k), row.get(k)) for k in keys):
+                existing.update(row)
+                return existing
+        return self._insert(table, row)
+
+
+def _same(a, b) -> bool:
+    # PostgREST confronta i valori come testo nella query string: 5 e "5" sono lo stesso id
+    if a is None or b is None:
+        return a is b
+    return a == b or str(a) == str(b)
+
+
+def _as_list(rows) -> list[dict]:
+    return rows if isinstance(rows, list) else [rows]
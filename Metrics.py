@@ -0,0 +1,256 @@
+# --- METRICHE ------------------------------------------------------------
+# Metriche in formato Prometheus (text exposition 0.0.4) servite da GET /metrics.
+# Implementazione minima senza dipendenze: le osservazioni avvengono tutte sull'event loop,
+# quindi bastano contatori Python senza lock (un incremento e un bisect per osservazione).
+import abc
+import math
+from bisect import bisect_left
+from pathlib import Path
+
+# tempi da 50µs a 10s: copre somma omomorfica (µs), group commit (ms) e chiamate all'Authority (s)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+
+    def labels(self, *values):
+        """
+        Ritorna la serie con i valori di label indicati (creata al primo uso). Conviene tenere
+        il riferimento alle serie fisse invece di chiamare labels() a ogni osservazione.
+        """
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: attese le label {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def set_function(self, fn, *values):
+        """
+        La serie viene calcolata da fn() al momento dello scrape (es. contatori tenuti da un altro oggetto)
+        """
+        self._children[tuple(str(v) for v in values)] = _FunctionValue(fn)
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """
+        Nuova serie vuota del tipo della metrica
+        """
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> list[str]:
+        try:
+            value = child.get()
+        except Exception:
+            # una sorgente non disponibile (es. file non ancora creato) non deve far fallire lo scrape
+            return []
+        return [f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def get(self) -> float:
+        return self.value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class _FunctionValue:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def get(self) -> float:
+        return self.fn()
+
+
+class Gauge(_Metric):
+    """
+    Gauge impostato con set() oppure calcolato al momento dello scrape con set_function(fn)
+    """
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "buckets", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, key, child) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.bounds + (math.inf,), child.buckets):
+            cumulative += n
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {repr(child.sum)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+# --- METRICHE DELL'AGGREGATORE -------------------------------------------
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "aggregator_stage_seconds",
+    "Durata delle fasi di submit_vote (parse, pk_fetch, homomorphic_add, persist) e get_result (db_read, decrypt, db_update)",
+    ("handler", "stage"),
+))
+VOTES_ACCEPTED = REGISTRY.register(Counter(
+    "aggregator_votes_accepted_total", "Voti aggregati per votazione", ("votazione_id",)))
+VOTES_REJECTED = REGISTRY.register(Counter(
+    "aggregator_votes_rejected_total", "Voti rifiutati per votazione e motivo", ("votazione_id", "reason")))
+PK_CACHE_REQUESTS = REGISTRY.register(Counter(
+    "aggregator_pk_cache_requests_total", "Richieste alla cache delle chiavi pubbliche per esito (hit/miss)", ("result",)))
+PK_CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "aggregator_pk_cache_hit_ratio", "Frazione delle richieste di chiave servite dalla cache"))
+OPEN_ACCUMULATORS = REGISTRY.register(Gauge(
+    "aggregator_open_accumulators", "Votazioni con un accumulatore aperto"))
+STORE_BYTES = REGISTRY.register(Gauge(
+    "aggregator_store_bytes", "Spazio su disco occupato dagli store", ("store",)))
+LOG_DROPPED = REGISTRY.register(Counter(
+    "aggregator_log_dropped_total", "Record di log scartati perché la coda di scrittura era piena"))
+ADMISSION_INFLIGHT = REGISTRY.register(Gauge(
+    "aggregator_admission_inflight", "Richieste di voto in elaborazione (global: processo, election: somma delle votazioni)",
+    ("scope",)))
+ADMISSION_QUEUED = REGISTRY.register(Gauge(
+    "aggregator_admission_queued", "Richieste di voto in attesa di un posto", ("scope",)))
+ADMISSION_SHED = REGISTRY.register(Counter(
+    "aggregator_admission_shed_total", "Richieste di voto rifiutate per sovraccarico (503 global, 429 election)",
+    ("scope",)))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "aggregator_upstream_seconds", "Durata dei singoli tentativi verso gli upstream per endpoint ed esito (ok, rejected, error)",
+    ("upstream", "endpoint", "outcome")))
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    "aggregator_upstream_retries_total", "Nuovi tentativi dopo un errore di rete, timeout, 5xx o 429", ("upstream", "endpoint")))
+UPSTREAM_HEDGES = REGISTRY.register(Counter(
+    "aggregator_upstream_hedges_total", "Richieste hedge inviate perché la prima superava il percentile di latenza",
+    ("upstream", "endpoint")))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "aggregator_circuit_state", "Stato del circuit breaker per upstream (0 chiuso, 1 in prova, 2 aperto)", ("upstream",)))
+SSE_SUBSCRIBERS = REGISTRY.register(Gauge(
+    "aggregator_sse_subscribers", "Client connessi agli stream SSE delle votazioni"))
+
+# serie fisse del percorso dei voti, risolte una volta sola
+VOTE_PARSE = STAGE_SECONDS.labels("submit_vote", "parse")
+VOTE_PK_FETCH = STAGE_SECONDS.labels("submit_vote", "pk_fetch")
+VOTE_ADD = STAGE_SECONDS.labels("submit_vote", "homomorphic_add")
+VOTE_PERSIST = STAGE_SECONDS.labels("submit_vote", "persist")
+RESULT_DB_READ = STAGE_SECONDS.labels("get_result", "db_read")
+RESULT_DECRYPT = STAGE_SECONDS.labels("get_result", "decrypt")
+RESULT_DB_UPDATE = STAGE_SECONDS.labels("get_result", "db_update")
+
+
+def path_size(path) -> int:
+    """
+    Byte occupati da uno store: somma dei file se path è una directory (es. log a segmenti),
+    altrimenti il file più gli eventuali -wal/-shm di SQLite
+    """
+    p = Path(path)
+    if p.is_dir():
+        return sum(f.stat().st_size for f in p.iterdir() if f.is_file())
+    total = p.stat().st_size
+    for suffix in ("-wal", "-shm"):
+        side = p.with_name(p.name + suffix)
+        if side.exists():
+            total += side.stat().st_size
+    return total
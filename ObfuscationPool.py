@@ -0,0 +1,90 @@
+# --- OBFUSCATION POOL ----------------------------------------------------
+import asyncio
+import logging
+from collections import deque
+
+import PaillierKernel
+
+
+class ObfuscationPool:
+    """
+    Scorta di offuscatori r^n mod n² precalcolati per la chiave pubblica di una votazione.
+      - size          : livello massimo (high watermark) a cui viene riempita la scorta
+      - low_watermark : sotto questo livello parte il riempimento in background
+      - chunk         : offuscatori calcolati per ogni task inviato al pool di processi
+      - parallelism   : task di calcolo eseguiti contemporaneamente
+    I valori sono calcolati nel ProcessPoolExecutor restituito da get_executor() e vengono consegnati
+    una sola volta (popleft): un offuscatore non viene mai riutilizzato per due cifrature.
+    """
+    def __init__(self, n: int, get_executor, size: int = 256, low_watermark: int = 64, chunk: int = 32,
+                 parallelism: int = 1):
+        self.raw = PaillierKernel.RawKey(n)
+        self._get_executor = get_executor
+        self.size = max(1, size)
+        self.low_watermark = min(max(0, low_watermark), self.size)
+        self.chunk = max(1, chunk)
+        self.parallelism = max(1, parallelism)
+        self._values: deque = deque()
+        self._refill_task: asyncio.Task | None = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._values)
+
+    def start(self):
+        self._maybe_refill(force=True)
+
+    def close(self):
+        self._closed = True
+        self._values.clear()
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            self._refill_task = None
+
+    async def take(self, count: int) -> list:
+        """
+        Consegna count offuscatori (mai consegnati prima): dalla scorta, quelli mancanti calcolati al momento.
+        """
+        available = min(count, len(self._values))
+        obfs = [self._values.popleft() for _ in range(available)]
+        if len(obfs) < count:
+            obfs.extend(await self._compute(count - len(obfs)))
+        self._maybe_refill()
+        return obfs
+
+    async def encrypt_many(self, votes: list[int]) -> list:
+        """
+        Cifra i voti usando gli offuscatori in scorta (una moltiplicazione per voto).
+        """
+        obfs = await self.take(len(votes))
+        return [PaillierKernel.encrypt_with(self.raw, m, r) for m, r in zip(votes, obfs)]
+
+    def _maybe_refill(self, force: bool = False):
+        if self._closed or (self._refill_task is not None and not self._refill_task.done()):
+            return
+        if force or len(self._values) < self.low_watermark:
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        try:
+            while not self._closed and len(self._values) < self.size:
+                # un giro = al più parallelism task da chunk valori, così la scorta cresce gradualmente
+                values = await self._compute(min(self.size - len(self._values), self.parallelism * self.chunk))
+                if self._closed:
+                    return
+                self._values.extend(values)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.info("Riempimento offuscatori non riuscito: %s", e)
+
+    async def _compute(self, count: int) -> list:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # count suddiviso in parti uguali tra i processi
+        per_task = -(-count // self.parallelism)
+        sizes = [min(per_task, count - i) for i in range(0, count, per_task)]
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(executor, PaillierKernel.obfuscators, int(self.raw.n), k) for k in sizes
+        ))
+        return [PaillierKernel.to_native(v) for chunk in chunks for v in chunk]
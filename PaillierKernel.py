@@ -0,0 +1,79 @@
+# --- PAILLIER KERNEL -----------------------------------------------------
+# Operazioni omomorfiche direttamente sui ciphertext interi, senza passare da paillier.EncryptedNumber:
+# la somma di due voti cifrati è il prodotto dei ciphertext modulo n².
+# Usa gli mpz di gmpy2 se installato (pip install gmpy2), altrimenti gli int di Python.
+import secrets
+
+try:
+    import gmpy2
+    HAVE_GMPY2 = True
+    to_native = gmpy2.mpz
+    powmod = gmpy2.powmod
+except ImportError:
+    HAVE_GMPY2 = False
+    to_native = int
+    powmod = pow
+
+
+class RawKey:
+    """
+    Parametri della chiave pubblica precalcolati per l'aggregazione: n e n² nel tipo nativo del kernel.
+    """
+    __slots__ = ("n", "nsquare")
+
+    def __init__(self, n: int):
+        self.n = to_native(n)
+        self.nsquare = self.n * self.n
+
+    def check(self, c) -> bool:
+        return 0 < c < self.nsquare
+
+
+def add(c1, c2, nsquare):
+    return c1 * c2 % nsquare
+
+
+def tree_sum(ciphertexts: list, nsquare):
+    """
+    Somma omomorfica di una lista (non vuota) di ciphertext come albero bilanciato di prodotti mod n²:
+    stesso numero di moltiplicazioni di una catena sequenziale, ma profondità log2(N).
+    """
+    layer = list(ciphertexts)
+    if not layer:
+        raise ValueError("Nessun ciphertext da sommare")
+    while len(layer) > 1:
+        nxt = [layer[i] * layer[i + 1] % nsquare for i in range(0, len(layer) - 1, 2)]
+        if len(layer) % 2:
+            nxt.append(layer[-1])
+        layer = nxt
+    return layer[0]
+
+
+def obfuscators(n: int, count: int) -> list[int]:
+    """
+    Calcola count offuscatori r^n mod n² con r casuale in [1, n) (la parte costosa della cifratura).
+    Funzione di modulo (serializzabile), pensata per essere eseguita in un ProcessPoolExecutor.
+    """
+    n = to_native(n)
+    nsquare = n * n
+    return [int(powmod(secrets.randbelow(int(n) - 1) + 1, n, nsquare)) for _ in range(count)]
+
+
+def encrypt_with(key: RawKey, m: int, obfuscator):
+    """
+    Cifratura Paillier con offuscatore precalcolato: con g = n + 1, g^m = 1 + n*m mod n²,
+    quindi c = (1 + n*m) * r^n mod n² costa una sola moltiplicazione.
+    """
+    return (1 + key.n * m) * obfuscator % key.nsquare
+
+
+def derived_obfuscators(base: list, count: int, nsquare, rng):
+    """
+    Genera count offuscatori validi con una moltiplicazione ciascuno, come passeggiata casuale
+    sui prodotti degli offuscatori base: (r_a^n)(r_b^n) = (r_a r_b)^n è ancora una potenza n-esima.
+    I valori NON sono indipendenti: usare solo per ballot sintetici (test di carico), mai per voti reali.
+    """
+    current = base[rng.randrange(len(base))]
+    for _ in range(count):
+        current = current * base[rng.randrange(len(base))] % nsquare
+        yield current
@@ -0,0 +1,156 @@
+# --- PUBLIC KEY CACHE ----------------------------------------------------
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from phe import paillier
+
+from PaillierKernel import RawKey
+
+
+def key_fingerprint(n: int) -> str:
+    """
+    Fingerprint di una chiave pubblica: sha256 della rappresentazione esadecimale di n
+    """
+    return hashlib.sha256(f"{n:x}".encode()).hexdigest()
+
+
+class CachedKey:
+    """
+    Chiave di una votazione in cache:
+      - public_key : paillier.PaillierPublicKey (cifratura, es. simulazioni)
+      - fingerprint: pk_fingerprint restituita dall'Authority
+      - raw        : n e n² precalcolati per l'aggregazione con PaillierKernel
+    """
+    __slots__ = ("public_key", "fingerprint", "raw")
+
+    def __init__(self, public_key: paillier.PaillierPublicKey, fingerprint: str):
+        self.public_key = public_key
+        self.fingerprint = fingerprint
+        self.raw = RawKey(public_key.n)
+
+
+class PublicKeyCache:
+    """
+    Cache LRU in-process delle chiavi pubbliche Paillier, indicizzata per votazione_id.
+      - fetch   : coroutine fetch(votazione_id) -> PublicKeyResponse (richiesta all'Authority)
+      - max_size: numero massimo di chiavi mantenute; oltre, viene rimossa la meno usata
+    Richieste concorrenti per la stessa votazione non ancora in cache condividono
+    un'unica richiesta all'Authority.
+    """
+    def __init__(self, fetch, max_size: int = 256):
+        self._fetch = fetch
+        self.max_size = max(1, int(max_size))
+        self._keys: OrderedDict[str, CachedKey] = OrderedDict()
+        # fingerprint già viste, conservate anche dopo eviction e invalidate(): rimosse solo da forget()
+        self._pinned: OrderedDict[str, str] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        # riferimenti ai task di pre-caricamento, per evitarne la garbage collection
+        self._background: set[asyncio.Task] = set()
+        # richieste servite dalla cache / che hanno richiesto (o atteso) una richiesta all'Authority
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, votazione_id) -> CachedKey:
+        """
+        Ritorna la chiave pubblica della votazione, richiedendola all'Authority solo se assente.
+        """
+        key = str(votazione_id)
+        entry = self._keys.get(key)
+        if entry is not None:
+            self._keys.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key))
+            self._inflight[key] = task
+        # shield: se un chiamante viene cancellato la richiesta condivisa prosegue per gli altri
+        return await asyncio.shield(task)
+
+    def prewarm(self, votazione_id):
+        """
+        Avvia in background il caricamento della chiave (es. subito dopo la creazione della votazione).
+        """
+        key = str(votazione_id)
+        if key in self._keys or key in self._inflight:
+            return
+        task = asyncio.create_task(self._prewarm(key))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def invalidate(self, votazione_id):
+        """
+        Rimuove la chiave della votazione; un'eventuale richiesta in corso non verrà salvata.
+        La fingerprint resta registrata: una nuova richiesta deve restituire la stessa chiave.
+        """
+        key = str(votazione_id)
+        self._keys.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def forget(self, votazione_id):
+        """
+        Votazione eliminata: rimuove anche la fingerprint registrata
+        """
+        self.invalidate(votazione_id)
+        self._pinned.pop(str(votazione_id), None)
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def fingerprint(self, votazione_id) -> str | None:
+        entry = self._keys.get(str(votazione_id))
+        return entry.fingerprint if entry else None
+
+    async def _prewarm(self, key: str):
+        try:
+            await self.get(key)
+        except Exception as e:
+            logging.info("Pre-caricamento chiave votazione %s non riuscito: %s", key, e)
+
+    async def _load(self, key: str) -> CachedKey:
+        me = asyncio.current_task()
+        try:
+            pk_model = await self._fetch(key)
+            entry = self._verify(key, pk_model)
+            # se nel frattempo la votazione è stata invalidata non salvo la chiave
+            if self._inflight.get(key) is me:
+                self._store(key, entry)
+            return entry
+        finally:
+            if self._inflight.get(key) is me:
+                del self._inflight[key]
+
+    def _verify(self, key: str, pk_model) -> CachedKey:
+        fingerprint = (pk_model.pk_fingerprint or "").strip()
+        if not fingerprint:
+            raise ValueError(f"Chiave della votazione {key} senza pk_fingerprint")
+
+        n = int(pk_model.n)
+        # phe usa sempre g = n + 1: un valore diverso indica una risposta incoerente
+        if int(pk_model.g) != n + 1:
+            raise ValueError(f"Chiave della votazione {key} non valida (g != n + 1)")
+        # la fingerprint deve essere quella di n (come la calcola l'Authority), non un valore qualsiasi
+        if fingerprint.lower() != key_fingerprint(n):
+            logging.warning("pk_fingerprint non corrispondente a n per la votazione %s", key)
+            raise ValueError(f"pk_fingerprint della votazione {key} non corrisponde alla chiave")
+
+        # una chiave diversa renderebbe inutilizzabile la somma omomorfica già accumulata
+        pinned = self._pinned.get(key)
+        if pinned is not None and pinned != fingerprint:
+            logging.warning("pk_fingerprint cambiato per la votazione %s: %s -> %s", key, pinned, fingerprint)
+            raise ValueError(f"pk_fingerprint della votazione {key} non corrisponde a quello registrato")
+        return CachedKey(paillier.PaillierPublicKey(n=n), fingerprint)
+
+    def _store(self, key: str, entry: CachedKey):
+        self._keys[key] = entry
+        self._keys.move_to_end(key)
+        while len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+        self._pinned[key] = entry.fingerprint
+        self._pinned.move_to_end(key)
+        while len(self._pinned) > self.max_size * 8:
+            self._pinned.popitem(last=False)
@@ -0,0 +1,246 @@
+# --- CLIENT RESILIENTE ---------------------------------------------------
+# Chiamate idempotenti verso un upstream (Authority) con:
+#   - timeout per tentativo e scadenza complessiva, invece di un unico timeout lungo
+#   - retry con backoff esponenziale e jitter ("full jitter") su errori di rete, timeout, 5xx e 429
+#   - hedging: se la risposta tarda oltre un percentile delle latenze recenti parte una seconda richiesta
+#     identica e vince la prima che risponde
+#   - circuit breaker: dopo troppi errori consecutivi le chiamate falliscono subito per reset_timeout secondi,
+#     poi una sola richiesta di prova decide se richiudere il circuito
+import asyncio
+import math
+import random
+import time
+from collections import deque
+
+import httpx
+
+from Metrics import UPSTREAM_SECONDS, UPSTREAM_RETRIES, UPSTREAM_HEDGES
+
+
+class UpstreamError(Exception):
+    """
+    Chiamata non riuscita dopo i tentativi previsti.
+      - status_code: stato HTTP della risposta dell'upstream (None per errori di rete o timeout)
+      - retry_after: secondi suggeriti prima di riprovare (se noti)
+    """
+    def __init__(self, detail: str, status_code: int | None = None, retry_after: float | None = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamError):
+    """
+    Circuito aperto: la chiamata non è stata nemmeno tentata
+    """
+
+
+class _Retryable(UpstreamError):
+    pass
+
+
+class LatencyWindow:
+    """
+    Ultime size latenze riuscite di un endpoint; percentile() ricalcolato al più ogni 16 campioni
+    """
+    MIN_SAMPLES = 20
+
+    def __init__(self, size: int = 256):
+        self._samples: deque[float] = deque(maxlen=size)
+        self._sorted: list[float] = []
+        self._stale = 0
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+        self._stale += 1
+
+    def percentile(self, q: float) -> float | None:
+        if len(self._samples) < self.MIN_SAMPLES:
+            return None
+        if self._stale >= 16 or not self._sorted:
+            self._sorted = sorted(self._samples)
+            self._stale = 0
+        i = min(len(self._sorted) - 1, max(0, math.ceil(q / 100 * len(self._sorted)) - 1))
+        return self._sorted[i]
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 0, 2, 1
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before(self):
+        """
+        Da chiamare prima di ogni tentativo: solleva CircuitOpenError se il circuito è aperto
+        (o se una richiesta di prova è già in corso)
+        """
+        if self.state == self.OPEN:
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError("circuito aperto", retry_after=math.ceil(remaining))
+            self.state, self._probing = self.HALF_OPEN, False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError("circuito in prova", retry_after=1)
+            self._probing = True
+
+    def success(self):
+        self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state, self._opened_at, self._probing = self.OPEN, time.monotonic(), False
+
+    def abandoned(self):
+        # tentativo cancellato (es. richiesta hedge superata dall'altra): la prova può ripartire
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+
+class ResilientClient:
+    """
+    Esegue POST idempotenti sul client httpx restituito da get_client() (il pool condiviso di UpstreamClients).
+    post() ritorna la risposta 2xx/3xx; solleva UpstreamError per 4xx (senza retry) e per errori persistenti,
+    CircuitOpenError se il circuito è aperto. Le latenze per endpoint sono esportate su /metrics.
+    """
+    def __init__(self, get_client, name: str, *, attempt_timeout: float = 10.0, deadline: float = 25.0,
+                 attempts: int = 3, backoff_base: float = 0.2, backoff_max: float = 2.0,
+                 hedge_percentile: float = 95.0, hedge_min: float = 0.05,
+                 breaker: CircuitBreaker | None = None):
+        self._get_client = get_client
+        self.name = name
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.attempts = max(1, attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min = hedge_min
+        self.breaker = breaker or CircuitBreaker()
+        self.latency: dict[str, LatencyWindow] = {}
+
+    async def post(self, endpoint: str, json: dict, hedge: bool = True) -> httpx.Response:
+        """
+        hedge=False per le chiamate che non si possono duplicare in parallelo in sicurezza
+        (es. creazione di una risorsa): restano solo retry e circuit breaker
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        error: UpstreamError | None = None
+        for attempt in range(self.attempts):
+            try:
+                return await self._hedged(endpoint, json, deadline, hedge)
+            except _Retryable as e:
+                error = e
+            if attempt + 1 >= self.attempts:
+                break
+            # full jitter: attesa casuale in [0, base * 2^attempt], rispettando Retry-After se indicato
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if error.retry_after is not None:
+                delay = max(delay, error.retry_after)
+            if loop.time() + delay >= deadline:
+                break
+            UPSTREAM_RETRIES.labels(self.name, endpoint).inc()
+            await asyncio.sleep(delay)
+        raise UpstreamError(error.detail, error.status_code, error.retry_after)
+
+    def hedge_delay(self, endpoint: str) -> float | None:
+        """
+        Attesa prima della richiesta hedge: percentile hedge_percentile delle latenze recenti
+        (None se l'hedging è disattivato o i campioni sono ancora pochi)
+        """
+        if self.hedge_percentile <= 0:
+            return None
+        window = self.latency.get(endpoint)
+        p = window.percentile(self.hedge_percentile) if window is not None else None
+        if p is None:
+            return None
+        return min(max(p, self.hedge_min), self.attempt_timeout)
+
+    async def _hedged(self, endpoint: str, json: dict, deadline: float, hedge: bool) -> httpx.Response:
+        hedge_after = self.hedge_delay(endpoint) if hedge else None
+        pending = {asyncio.create_task(self._attempt(endpoint, json, deadline))}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=hedge_after,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # il primo tentativo è più lento del percentile: seconda richiesta in parallelo
+                    hedge_after = None
+                    UPSTREAM_HEDGES.labels(self.name, endpoint).inc()
+                    pending.add(asyncio.create_task(self._attempt(endpoint, json, deadline)))
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                # il primo tentativo è fallito prima dell'hedge: si passa al retry
+                hedge_after = None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, endpoint: str, json: dict, deadline: float) -> httpx.Response:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise _Retryable("scadenza superata")
+        self.breaker.before()
+        # ogni tentativo ammesso dal breaker viene registrato (success/failure/abandoned) in ogni caso,
+        # altrimenti una richiesta di prova non conclusa lascerebbe il circuito in prova per sempre
+        outcome = self.breaker.abandoned
+        t0 = time.perf_counter()
+        try:
+            try:
+                # wait_for invece del timeout di httpx: vale anche per i transport in-process (ASGITransport)
+                resp = await asyncio.wait_for(self._get_client().post(endpoint, json=json),
+                                              min(self.attempt_timeout, remaining))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # errori di rete e timeout, ma anche DecodingError, TooManyRedirects, client chiuso, ...
+                outcome = self.breaker.failure
+                UPSTREAM_SECONDS.labels(self.name, endpoint, "error").observe(time.perf_counter() - t0)
+                raise _Retryable(str(e) or type(e).__name__)
+            elapsed = time.perf_counter() - t0
+
+            status = resp.status_code
+            if status >= 500 or status == 429:
+                outcome = self.breaker.failure if status >= 500 else self.breaker.success
+                UPSTREAM_SECONDS.labels(self.name, endpoint, "error").observe(elapsed)
+                raise _Retryable(f"HTTP {status}", status, _retry_after(resp))
+            outcome = self.breaker.success
+            if status >= 400:
+                UPSTREAM_SECONDS.labels(self.name, endpoint, "rejected").observe(elapsed)
+                raise UpstreamError(_detail(resp), status)
+            UPSTREAM_SECONDS.labels(self.name, endpoint, "ok").observe(elapsed)
+            self.latency.setdefault(endpoint, LatencyWindow()).add(elapsed)
+            return resp
+        finally:
+            outcome()
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _detail(resp: httpx.Response) -> str:
+    try:
+        body = resp.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and "detail" in body:
+        return str(body["detail"])
+    return resp.text or f"HTTP {resp.status_code}"
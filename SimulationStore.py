@@ -4,10 +4,11 @@ class SimulationStore:
     """
     Piccolo KV store file-based con locking.
     Salva un dict {simulation_id(str): {categoria, votazione_id, user_ids}} in self.path.
+    Le operazioni (lettura + scrittura del file) sono atomiche anche se chiamate da più thread (asyncio.to_thread).
     """
     def __init__(self, path: str):
         self.path = path
-        self._lock = threading.Lock()
+        self._lock = threading.RLock()
         os.makedirs(os.path.dirname(self.path), exist_ok=True)
         if not os.path.exists(self.path):
             with open(self.path, "w", encoding="utf-8") as f:
@@ -36,9 +37,10 @@ class SimulationStore:
 
     def set(self, sim_id: int, payload: dict) -> None:
         key = str(sim_id)
-        data = self._read()
-        data[key] = payload
-        self._write(data)
+        with self._lock:
+            data = self._read()
+            data[key] = payload
+            self._write(data)
 
     def get(self, sim_id: int):
         key = str(sim_id)
@@ -47,21 +49,23 @@ class SimulationStore:
 
     def pop(self, sim_id: int):
         key = str(sim_id)
-        data = self._read()
-        val = data.pop(key, None)
-        self._write(data)
+        with self._lock:
+            data = self._read()
+            val = data.pop(key, None)
+            self._write(data)
         return val
 
     def next_id(self) -> int:
-        data = self._read()
-        meta = data.get("_meta", {})
-        next_id = meta.get("next_id")
-        if not isinstance(next_id, int):
-            # fallback: calcola dal massimo tra le chiavi numeriche
-            numeric_keys = [int(k) for k in data.keys() if k.isdigit()]
-            next_id = (max(numeric_keys) if numeric_keys else 0) + 1
-        sim_id = next_id
-        meta["next_id"] = sim_id + 1
-        data["_meta"] = meta
-        self._write(data)
+        with self._lock:
+            data = self._read()
+            meta = data.get("_meta", {})
+            next_id = meta.get("next_id")
+            if not isinstance(next_id, int):
+                # fallback: calcola dal massimo tra le chiavi numeriche
+                numeric_keys = [int(k) for k in data.keys() if k.isdigit()]
+                next_id = (max(numeric_keys) if numeric_keys else 0) + 1
+            sim_id = next_id
+            meta["next_id"] = sim_id + 1
+            data["_meta"] = meta
+            self._write(data)
         return sim_id
\ No newline at end of file
@@ -0,0 +1,113 @@
+# --- SQLITE ACCUMULATOR --------------------------------------------------
+import os, sqlite3, threading
+
+
+class SqliteAccumulator:
+    """
+    Accumulatore su SQLite in modalità WAL, condivisibile tra più processi (worker uvicorn).
+    Stessa API di FileAccumulator (get/set/clear/set_many) più update(), che esegue
+    lettura-somma-scrittura di una votazione in un'unica transazione.
+    Tabella:
+      accumulators(election_id TEXT PK, c BLOB, exp INTEGER, count INTEGER)
+    Il ciphertext è salvato come BLOB big-endian invece che come stringa decimale.
+    """
+    # store condiviso tra processi: MemoryAccumulator non deve tenerne una copia in memoria
+    transactional = True
+
+    def __init__(self, path: str, synchronous: str = "FULL", busy_timeout_ms: int = 5000):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn().execute("""
+            CREATE TABLE IF NOT EXISTS accumulators (
+                election_id TEXT PRIMARY KEY,
+                c BLOB NOT NULL,
+                exp INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        # una connessione per thread (asyncio.to_thread usa un pool di thread)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_blob(c: int) -> bytes:
+        c = int(c)
+        return c.to_bytes((c.bit_length() + 7) // 8 or 1, "big")
+
+    @staticmethod
+    def _from_blob(b: bytes) -> int:
+        return int.from_bytes(b, "big")
+
+    def get(self, election_id: str) -> tuple[int, int, int] | None:
+        """
+        Ritorna (c, exp, count) oppure None se non c'è ancora accumulato.
+        """
+        row = self._conn().execute(
+            "SELECT c, exp, count FROM accumulators WHERE election_id = ?", (election_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self._from_blob(row[0]), int(row[1]), int(row[2])
+
+    def set(self, election_id: str, c: int, exp: int, count: int):
+        self.set_many({election_id: (c, exp, count)})
+
+    def clear(self, election_id: str):
+        self.set_many({election_id: None})
+
+    def set_many(self, updates: dict[str, tuple[int, int, int] | None]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for election_id, rec in updates.items():
+                if rec is None:
+                    conn.execute("DELETE FROM accumulators WHERE election_id = ?", (election_id,))
+                else:
+                    self._upsert(conn, election_id, rec)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update(self, election_id: str, fn) -> tuple[int, int, int]:
+        """
+        Legge l'accumulatore, applica fn(current) e scrive il risultato nella stessa transazione:
+        BEGIN IMMEDIATE prende il lock di scrittura, quindi aggiornamenti concorrenti da altri processi
+        vengono serializzati e nessun voto va perso.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT c, exp, count FROM accumulators WHERE election_id = ?", (election_id,)
+            ).fetchone()
+            current = None if row is None else (self._from_blob(row[0]), int(row[1]), int(row[2]))
+            new = fn(current)
+            self._upsert(conn, election_id, new)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return new
+
+    def count(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM accumulators").fetchone()[0])
+
+    def _upsert(self, conn: sqlite3.Connection, election_id: str, rec: tuple[int, int, int]):
+        c, exp, count = rec
+        conn.execute(
+            "INSERT INTO accumulators (election_id, c, exp, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(election_id) DO UPDATE SET c = excluded.c, exp = excluded.exp, count = excluded.count",
+            (election_id, self._to_blob(c), int(exp), int(count)),
+        )
@@ -0,0 +1,63 @@
+import json, os, sqlite3, threading
+
+class SqliteSimulationStore:
+    """
+    Versione SQLite (WAL) di SimulationStore, utilizzabile da più processi.
+    Stessa API: set/get/pop/next_id. Gli id sono assegnati da una tabella sequenza AUTOINCREMENT,
+    quindi due worker non ottengono mai lo stesso simulation_id.
+    """
+    def __init__(self, path: str, synchronous: str = "FULL", busy_timeout_ms: int = 5000):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS simulations (id INTEGER PRIMARY KEY, payload TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS simulation_seq (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def set(self, sim_id: int, payload: dict) -> None:
+        self._conn().execute(
+            "INSERT INTO simulations (id, payload) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET payload = excluded.payload",
+            (int(sim_id), json.dumps(payload, ensure_ascii=False)),
+        )
+
+    def get(self, sim_id: int):
+        row = self._conn().execute("SELECT payload FROM simulations WHERE id = ?", (int(sim_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pop(self, sim_id: int):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT payload FROM simulations WHERE id = ?", (int(sim_id),)).fetchone()
+            conn.execute("DELETE FROM simulations WHERE id = ?", (int(sim_id),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return json.loads(row[0]) if row else None
+
+    def next_id(self) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            sim_id = conn.execute("INSERT INTO simulation_seq DEFAULT VALUES").lastrowid
+            # sqlite_sequence conserva il massimo: la riga può essere eliminata senza riusare l'id
+            conn.execute("DELETE FROM simulation_seq WHERE id = ?", (sim_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return int(sim_id)
@@ -1,11 +1,19 @@
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from Config import SUPABASE_BACKEND, SUPABASE_MEMORY_SEED
 
-load_dotenv()
 
-url = os.environ["SUPABASE_URL"]
-key = os.environ["SUPABASE_SERVICE_ROLE"]  # backend → service_role
-supabase: Client = create_client(url, key)
+load_dotenv()
 
+if SUPABASE_BACKEND == "memory":
+    # database in memoria per test offline: nessun client di rete viene creato
+    from MemorySupabase import MemorySupabase
+    supabase = MemorySupabase.from_seed_file(SUPABASE_MEMORY_SEED)
+elif SUPABASE_BACKEND == "supabase":
+    from supabase import create_client, Client
+    url = os.environ["SUPABASE_URL"]
+    key = os.environ["SUPABASE_SERVICE_ROLE"]  # backend → service_role
+    supabase: Client = create_client(url, key)
+else:
+    raise ValueError(f"SUPABASE_BACKEND non supportato: {SUPABASE_BACKEND}")
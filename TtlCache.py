@@ -0,0 +1,43 @@
+# --- TTL CACHE -----------------------------------------------------------
+import time
+from collections import OrderedDict
+
+
+class TtlCache:
+    """
+    Cache in-process con scadenza (ttl secondi) e al più max_size voci (rimossa la meno recente).
+    clear() incrementa generation: chi ha avviato un caricamento prima dell'invalidazione
+    passa la generation letta a set(), che scarta il valore ormai vecchio.
+    """
+    def __init__(self, ttl: float, max_size: int = 256):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, generation: int | None = None):
+        if self.ttl <= 0 or (generation is not None and generation != self.generation):
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        item = self._data.pop(key, None)
+        return item[1] if item is not None else None
+
+    def clear(self):
+        self._data.clear()
+        self.generation += 1
@@ -70,6 +70,55 @@ def get_all_users():
         return {"status" : f"{e}"}, None
 
 
+def get_admin_ids() -> list[str]:
+    """
+    Id degli admin, con la stessa regola di get_all_users (ruolo confrontato senza spazi né maiuscole):
+    il filtro lato server (%admin%) riduce solo le righe lette, il confronto esatto è fatto qui
+    """
+    try:
+        resp = supabase.table("user_roles").select("user_id, role").ilike("role", "%admin%").execute()
+        return [str(r["user_id"]) for r in resp.data or []
+                if r.get("user_id") is not None and (r.get("role") or "").strip().lower() == "admin"]
+    except Exception as e:
+        raise RuntimeError(f"Impossibile selezionare gli admin: {e}")
+
+
+def list_users_page(limit: int, cursor: str | None = None, categoria: str | None = None,
+                    exclude_ids: list[str] | None = None) -> list[dict]:
+    """
+    Pagina di profili ordinata per id (keyset): al più limit righe con id > cursor,
+    filtrate lato server per categoria ed escludendo exclude_ids (es. gli admin).
+    L'esclusione è una lista not.in nella query (cresce con il numero di admin, che restano pochi):
+    il progetto non gestisce viste o funzioni RPC nello schema Supabase.
+    """
+    try:
+        query = supabase.table("profiles").select("id, nome, cognome, categoria")
+        if cursor:
+            query = query.gt("id", cursor)
+        if categoria:
+            query = query.eq("categoria", categoria)
+        if exclude_ids:
+            query = query.not_.in_("id", exclude_ids)
+        resp = query.order("id").limit(limit).execute()
+        return resp.data or []
+    except Exception as e:
+        raise RuntimeError(f"Impossibile selezionare gli utenti: {e}")
+
+
+def count_eligible_users(categoria: str) -> int:
+    """
+    Numero di utenti non admin della categoria (votanti attesi di una votazione)
+    """
+    try:
+        query = supabase.table("profiles").select("id", count="exact", head=True).eq("categoria", categoria)
+        admin_ids = get_admin_ids()
+        if admin_ids:
+            query = query.not_.in_("id", admin_ids)
+        return int(query.execute().count or 0)
+    except Exception as e:
+        raise RuntimeError(f"Impossibile contare gli utenti della categoria: {e}")
+
+
 def delete_user(user_id: str):
     try:
         supabase.auth.admin.delete_user(user_id)
@@ -77,10 +126,21 @@ def delete_user(user_id: str):
         supabase.table("profiles").delete().eq("id", user_id).execute()
         return {"status": "ok"}
     except Exception as e:
-        logging.info(f"ERRORE DELETE UTENTE {user_id} causa {e}")
+        logging.info("ERRORE DELETE UTENTE %s causa %s", user_id, e)
         return {"status" : f"{e}"}
 
 
+def delete_users_data(user_ids: list[str], chunk: int = 200):
+    """
+    Elimina le righe di 'votes' e 'profiles' di più utenti con un filtro in_ per tabella
+    (suddiviso in blocchi da chunk id per non superare la lunghezza massima dell'URL)
+    """
+    for i in range(0, len(user_ids), chunk):
+        ids = user_ids[i:i + chunk]
+        supabase.table("votes").delete().in_("user_id", ids).execute()
+        supabase.table("profiles").delete().in_("id", ids).execute()
+
+
 def change_categoria(user_id, categoria):
     try:
         supabase.table("profiles").update({"categoria": categoria}).eq("id", user_id).execute()
@@ -88,6 +148,14 @@ def change_categoria(user_id, categoria):
     except Exception as e:
         return {"status" : f"{e}"}
 
+def upsert_profiles(rows: list[dict]):
+    """
+    Aggiorna (o inserisce) più profili con una sola richiesta: rows = [{id, nome, cognome, categoria}, ...]
+    """
+    if not rows:
+        return
+    supabase.table("profiles").upsert(rows, on_conflict="id").execute()
+
 def rand_name():
     nomi = ["Marco","Sara","Elisa","Paolo","Chiara","Davide","Marta","Giorgio","Francesca","Alessio","Irene","Stefano"]
     cognomi = ["Rossi","Bianchi","Verdi","Neri","Gialli","Blu","Fontana","Greco","Marini","Ferrari","Conti","Scola"]
@@ -158,9 +226,13 @@ def insert_election(topic: str, categoria: str):
     except Exception as e:
         raise RuntimeError(f"Impossibile inserire la votazione: {e}")
 
-def update_election(votazione_id: int, yes_total: int, no_total: int, concluded: bool):
+def update_election(votazione_id: int, yes_total: int, no_total: int, concluded: bool) -> bool:
+    """
+    :return False se la votazione non esiste (nessuna riga aggiornata):
+    """
     try:
-       supabase.table("votazioni").update({"si": yes_total, "no": no_total, "concluded": True}).eq("id", votazione_id).execute()
+       resp = supabase.table("votazioni").update({"si": yes_total, "no": no_total, "concluded": True}).eq("id", votazione_id).execute()
+       return bool(resp.data)
     except Exception as e:
         raise RuntimeError(f"Impossibile inserire la votazione: {e}")
 
@@ -171,6 +243,26 @@ def get_election(votazione_id: int):
     except Exception as e:
         raise RuntimeError(f"Impossibile trovare la votazione: {e}")
 
+def get_election_result(votazione_id: int) -> dict:
+    try:
+        resp = supabase.table("votazioni").select("si,no,concluded").eq("id", votazione_id).single().execute()
+        return resp.data or {}
+    except Exception as e:
+        raise RuntimeError(f"Impossibile trovare la votazione: {e}")
+
+def get_elections(votazione_ids: list[int], chunk: int = 200) -> list[dict]:
+    """
+    Righe di più votazioni con un filtro in_ (a blocchi di chunk id per la lunghezza massima dell'URL)
+    """
+    rows = []
+    try:
+        for i in range(0, len(votazione_ids), chunk):
+            resp = supabase.table("votazioni").select().in_("id", votazione_ids[i:i + chunk]).execute()
+            rows.extend(resp.data or [])
+    except Exception as e:
+        raise RuntimeError(f"Impossibile trovare le votazioni: {e}")
+    return rows
+
 def delete_election(votazione_id: int):
     try:
         supabase.table("votes").delete().eq("votazione_id", votazione_id).execute()
@@ -0,0 +1,73 @@
+# --- VERSIONED CACHE -----------------------------------------------------
+import asyncio
+import hashlib
+import json
+import time
+
+
+class CachedBody:
+    """
+    Risposta JSON già serializzata, con ETag calcolato dal contenuto (uguale tra worker e riavvii)
+    """
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class VersionedCache:
+    """
+    Cache di una singola lista letta dal database (es. votazioni, categorie).
+    Ogni scrittura sulla tabella chiama bump(): la versione cambia e la lista viene riletta alla richiesta
+    successiva. ttl (secondi) è un limite di sicurezza per le modifiche fatte da altri processi.
+    Letture concorrenti a cache vuota condividono un'unica query.
+    """
+    def __init__(self, ttl: float = 30):
+        self.ttl = ttl
+        self.version = 0
+        self._cached: CachedBody | None = None
+        self._cached_version = -1
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+
+    def bump(self):
+        self.version += 1
+
+    def current(self) -> CachedBody | None:
+        if self._cached is not None and self._cached_version == self.version and time.monotonic() < self._expires:
+            return self._cached
+        return None
+
+    async def get(self, loader) -> CachedBody:
+        """
+        loader: coroutine senza argomenti che ritorna il contenuto serializzabile in JSON
+        """
+        cached = self.current()
+        if cached is not None:
+            return cached
+        async with self._lock:
+            cached = self.current()
+            if cached is not None:
+                return cached
+            version = self.version
+            data = await loader()
+            cached = CachedBody(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            # una scrittura avvenuta durante la lettura rende il risultato già vecchio: lo restituisco senza salvarlo
+            if version == self.version:
+                self._cached, self._cached_version = cached, version
+                self._expires = time.monotonic() + self.ttl
+            return cached
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Confronto debole di If-None-Match (lista di ETag separati da virgola, anche W/"..." oppure *)
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
@@ -1,15 +1,64 @@
-import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
 from phe import paillier
 from UserFunctions import *
+import asyncio
+import contextlib
+import httpx
+import json
+import math
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+import AsyncUserFunctions as db
+import PaillierKernel
 import logging
 
+from Config import (AUTH_BASE, AUTHORITY_BACKEND, AUTH_ATTEMPT_TIMEOUT_S, AUTH_DEADLINE_S, AUTH_RETRY_ATTEMPTS,
+                    AUTH_RETRY_BASE_MS, AUTH_RETRY_MAX_MS, AUTH_HEDGE_PERCENTILE, AUTH_HEDGE_MIN_MS,
+                    AUTH_BREAKER_FAILURES, AUTH_BREAKER_RESET_S, AUTH_BATCH_DECRYPT, PK_CACHE_SIZE,
+                    ACCUMULATOR_BACKEND, LOG_SEGMENT_MAX_BYTES, LOG_COMPACT_SEGMENTS, LOG_FSYNC,
+                    GROUP_COMMIT_WINDOW_MS, GROUP_COMMIT_MAX_VOTES, SIMULATION_BACKEND, SQLITE_PATH,
+                    SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SIM_PROVISION_CONCURRENCY, SIM_CHECKPOINT_EVERY,
+                    SIM_TEARDOWN_CONCURRENCY, SIM_SYNTHETIC_MIN, SIM_SYNTHETIC_MAX, SIM_SYNTHETIC_CONCURRENCY,
+                    SIM_SYNTHETIC_CHUNK, SIM_SYNTHETIC_BASE_OBFUSCATORS,
+                    SIM_ENCRYPT_WORKERS, OBF_POOL_SIZE, OBF_POOL_LOW, OBF_POOL_CHUNK,
+                    USERS_CACHE_TTL, USERS_CACHE_SIZE, USERS_PAGE_MAX, LISTS_CACHE_TTL, RESULT_CACHE_SIZE,
+                    RESULT_BATCH_CONCURRENCY, RESULT_BATCH_MAX, EXPECTED_RETRY_S,
+                    SSE_COALESCE_MS, SSE_HEARTBEAT_S, SSE_MAX_DURATION_S,
+                    ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_ELECTION_MAX_INFLIGHT,
+                    ADMISSION_ELECTION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_MS, VOTE_BATCH_MAX,
+                    METRICS_ELECTION_SERIES_MAX, ADMISSION_ELECTION_IDLE_TTL_S)
+from AdmissionControl import AdmissionControl, Overloaded
+from ElectionEvents import ElectionEvents
+from ElectionStore import ElectionStore, SqliteElectionStore
 from FileAccumulator import FileAccumulator
+from HttpClients import UpstreamClients
+from LogAccumulator import LogAccumulator
+from LogSetup import setup_logging, start_logging, stop_logging, dropped_records, VOTE_LOGGER
+from Metrics import (REGISTRY, CONTENT_TYPE, VOTES_ACCEPTED, VOTES_REJECTED, PK_CACHE_REQUESTS, PK_CACHE_HIT_RATIO,
+                     OPEN_ACCUMULATORS, STORE_BYTES, VOTE_PARSE, VOTE_PK_FETCH, VOTE_ADD, VOTE_PERSIST,
+                     RESULT_DB_READ, RESULT_DECRYPT, RESULT_DB_UPDATE, LOG_DROPPED, SSE_SUBSCRIBERS,
+                     ADMISSION_INFLIGHT, ADMISSION_QUEUED, ADMISSION_SHED, CIRCUIT_STATE, path_size)
+from MemoryAccumulator import MemoryAccumulator
+from ObfuscationPool import ObfuscationPool
+from PublicKeyCache import PublicKeyCache
+from ResilientClient import ResilientClient, CircuitBreaker, CircuitOpenError, UpstreamError
 from SimulationStore import SimulationStore
+from SqliteAccumulator import SqliteAccumulator
+from SqliteSimulationStore import SqliteSimulationStore
+from TtlCache import TtlCache
+from VersionedCache import VersionedCache, etag_matches
+
 
+# errori di scrittura dell'accumulatore (disco pieno, file non scrivibile, "database is locked" di SQLite):
+# il voto non è stato registrato e il client può riprovare (503)
+PERSIST_ERRORS = (OSError, sqlite3.Error)
 
-logging.basicConfig(filename='python_logs.log', level=logging.INFO, format='%(asctime)s - %(message)s')
+# log scritti da un thread di background (coda + rotazione), mai dall'event loop
+setup_logging()
+vote_log = logging.getLogger(VOTE_LOGGER)
 
 class PublicKeyResponse(BaseModel):
     n: str
@@ -26,6 +75,22 @@ class ResultModel(BaseModel):
     votazione_id: int
     num_utenti: int
 
+class ResultBatchItem(BaseModel):
+    votazione_id: int
+    num_utenti: int | None = None
+    # chiusura esplicita con i voti ricevuti finora (num_utenti ignorato)
+    force: bool = False
+
+class ResultBatchBody(BaseModel):
+    votazioni: list[ResultBatchItem]
+
+class ResultBatchResult(BaseModel):
+    votazione_id: int
+    status: str
+    si: str | None = None
+    no: str | None = None
+    detail: str | None = None
+
 class User(BaseModel):
     id: str
     nome: str
@@ -47,6 +112,8 @@ class SimulationStart(BaseModel):
     count: int
     categoria: str
     topic: str
+    mode: str = "accounts"  # "accounts": utenti auth fittizi (10-30), "synthetic": solo ballot (10k-1M)
+    seed: int | None = None  # modalità sintetica: seme per voti riproducibili
 
 class SimulationResponse(BaseModel):
     simulation_id: int
@@ -54,6 +121,7 @@ class SimulationResponse(BaseModel):
     votazione_id: int
     generated_users: list[User]
     result: dict[str, int]  # {"Totale SI":..., "Totale NO":..., "Totale voti":...}
+    metrics: dict[str, float] | None = None  # modalità sintetica: throughput e latenze
 
 class SimulationEndModel(BaseModel):
     simulation_id: int
@@ -68,6 +136,12 @@ class DecryptTallyModel(BaseModel):
     votazione_id: int
     ciphertext_sum: int
 
+class DecryptTallyBatchItem(BaseModel):
+    votazione_id: int
+    plain_sum: int | None = None
+    status_code: int = 200
+    detail: str | None = None
+
 class DeleteUserModel(BaseModel):
     user_id: str
 
@@ -77,24 +151,142 @@ class NewCategoriaModel(BaseModel):
 class NewElectionModel(BaseModel):
     topic: str
     categoria: str
+    num_utenti: int | None = None  # votanti attesi; se assente: utenti non admin della categoria
+    # limiti di admission control della votazione; se assenti: ADMISSION_ELECTION_MAX_INFLIGHT/_QUEUE (0 = nessuno)
+    admission_max_inflight: int | None = None
+    admission_max_queue: int | None = None
 
 class DeleteElectionModel(BaseModel):
     votazione_id: int
 
-AUTH_BASE = "https://authority-k9w7.onrender.com/api/authority/"
-VOTE_BASE = "https://aggregator-ynd5.onrender.com/api/aggregator/"
+class BatchVoteItem(BaseModel):
+    votazione_id: int
+    ciphertext: str
 
-class VotingSystemAPI:
+class SubmitVoteBatchBody(BaseModel):
+    votes: list[BatchVoteItem]
 
+class BatchVoteResult(BaseModel):
+    votazione_id: int
+    status: str
+    detail: str | None = None
+
+def open_accumulator(backend: str = ACCUMULATOR_BACKEND):
+    """
+    Crea l'accumulatore configurato (ACCUMULATOR_BACKEND): "file" (default), "log" oppure "sqlite"
+    """
+    if backend == "sqlite":
+        return SqliteAccumulator(SQLITE_PATH, synchronous=SQLITE_SYNCHRONOUS, busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS)
+    if backend == "log":
+        return LogAccumulator("data/votazioni/log", segment_max_bytes=LOG_SEGMENT_MAX_BYTES,
+                              compact_segments=LOG_COMPACT_SEGMENTS, fsync=LOG_FSYNC)
+    if backend == "file":
+        return FileAccumulator("data/votazioni/votazioni.json")
+    raise ValueError(f"ACCUMULATOR_BACKEND non supportato: {backend}")
+
+def open_simulation_store(backend: str = SIMULATION_BACKEND):
+    """
+    Crea lo store delle simulazioni configurato (SIMULATION_BACKEND): "file" (default) oppure "sqlite"
+    """
+    if backend == "sqlite":
+        return SqliteSimulationStore(SQLITE_PATH, synchronous=SQLITE_SYNCHRONOUS,
+                                     busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS)
+    if backend == "file":
+        return SimulationStore("data/simulations/simulations.json")
+    raise ValueError(f"SIMULATION_BACKEND non supportato: {backend}")
+
+def open_election_store(backend: str = ACCUMULATOR_BACKEND):
+    """
+    Crea lo store dei metadati delle votazioni: SQLite se l'accumulatore è su SQLite, altrimenti file JSON
+    """
+    if backend == "sqlite":
+        return SqliteElectionStore(SQLITE_PATH, synchronous=SQLITE_SYNCHRONOUS, busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS)
+    return ElectionStore("data/votazioni/elections.json")
+
+class VotingSystemAPI:
+    """
+    Aggregatore dei voti. Va eseguito con un solo worker (es. uvicorn --workers 1): chiavi in cache e fingerprint
+    registrate, risultati, scrutini in corso (single-flight), votanti attesi, stream SSE, admission control e
+    scorte di offuscatori sono nella memoria del processo. Con più worker ognuno eseguirebbe il proprio scrutinio
+    e servirebbe il proprio stato. I backend SQLite (accumulatori, metadati, simulazioni) sono sicuri tra processi,
+    ma non coordinano il resto: servono per la durabilità e per strumenti esterni (es. benchmark), non per scalare.
+    """
 
     def __init__(self):
         self.router = APIRouter(prefix="/api/aggregator")
-        self.acc = FileAccumulator("data/votazioni/votazioni.json")
-        self.sim_store = SimulationStore("data/simulations/simulations.json")
+        # accumulatori in memoria con lock per votazione, persistiti a group-commit sul backend configurato
+        self.acc = MemoryAccumulator(open_accumulator(), commit_window=GROUP_COMMIT_WINDOW_MS / 1000,
+                                     commit_max=GROUP_COMMIT_MAX_VOTES)
+        self.sim_store = open_simulation_store()
+        self.pk_cache = PublicKeyCache(self.get_pk, max_size=PK_CACHE_SIZE)
+        # AUTHORITY_BACKEND=local: Authority in-process (AuthorityStub), le richieste non escono dal processo
+        self.authority_stub = None
+        transports = None
+        if AUTHORITY_BACKEND == "local":
+            from AuthorityStub import AuthorityStub
+            self.authority_stub = AuthorityStub()
+            transports = {"auth": httpx.ASGITransport(app=self.authority_stub.app)}
+        elif AUTHORITY_BACKEND != "http":
+            raise ValueError(f"AUTHORITY_BACKEND non supportato: {AUTHORITY_BACKEND}")
+        self.http = UpstreamClients(AUTH_BASE, transports=transports)
+        # chiamate all'Authority con retry, circuit breaker e hedging (solo decrypt_tally, vedi get_pk)
+        self.authority = ResilientClient(
+            lambda: self.http.auth, "authority",
+            attempt_timeout=AUTH_ATTEMPT_TIMEOUT_S, deadline=AUTH_DEADLINE_S, attempts=AUTH_RETRY_ATTEMPTS,
+            backoff_base=AUTH_RETRY_BASE_MS / 1000, backoff_max=AUTH_RETRY_MAX_MS / 1000,
+            hedge_percentile=AUTH_HEDGE_PERCENTILE, hedge_min=AUTH_HEDGE_MIN_MS / 1000,
+            breaker=CircuitBreaker(AUTH_BREAKER_FAILURES, AUTH_BREAKER_RESET_S),
+        )
+        self._encrypt_pool: ProcessPoolExecutor | None = None
+        # votazione_id -> scorta di offuscatori precalcolati per cifrare i voti delle simulazioni
+        self.obf_pools: dict[str, ObfuscationPool] = {}
+        # pagine di /elections/users (e id degli admin), invalidate quando cambiano i profili
+        self.users_cache = TtlCache(USERS_CACHE_TTL, max_size=USERS_CACHE_SIZE)
+        # /elections/votazioni e /categoria/list: nuova versione a ogni scrittura sulle rispettive tabelle
+        self.elections_cache = VersionedCache(ttl=LISTS_CACHE_TTL)
+        self.categorie_cache = VersionedCache(ttl=LISTS_CACHE_TTL)
+        # votanti attesi per votazione aperta (None = nessuno scrutinio automatico), persistiti per i riavvii
+        # e rimossi a scrutinio o eliminazione; le votazioni i cui votanti non si sono potuti ricavare
+        # restano in _expected_retry per EXPECTED_RETRY_S secondi prima di un nuovo tentativo
+        self.elections_store = open_election_store()
+        self.expected: dict[str, int | None] = {}
+        self._expected_tasks: dict[str, asyncio.Task] = {}
+        self._expected_retry = TtlCache(EXPECTED_RETRY_S, max_size=RESULT_CACHE_SIZE)
+        # votazioni con serie proprie in /metrics (vedi _metric_id)
+        self._metric_ids: set[str] = set()
+        # scrutini in corso (uno per votazione, condiviso da tutti i richiedenti) e risultati delle votazioni
+        # concluse, serviti da get_result senza leggere Supabase (i risultati non cambiano più)
+        self._tallies: dict[str, tuple[asyncio.Future, int]] = {}
+        self.results = TtlCache(math.inf, max_size=RESULT_CACHE_SIZE)
+        self._background: set[asyncio.Task] = set()
+        # limiti di concorrenza del percorso dei voti (globale e per votazione)
+        self.admission = AdmissionControl(ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_ELECTION_MAX_INFLIGHT,
+                                          ADMISSION_ELECTION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+                                          idle_ttl=ADMISSION_ELECTION_IDLE_TTL_S)
+        # stato live delle votazioni per gli stream SSE (conteggio voti, esito)
+        self.events = ElectionEvents(coalesce_window=SSE_COALESCE_MS / 1000)
+
+        # metriche calcolate al momento dello scrape di /metrics
+        PK_CACHE_REQUESTS.set_function(lambda: self.pk_cache.hits, "hit")
+        PK_CACHE_REQUESTS.set_function(lambda: self.pk_cache.misses, "miss")
+        PK_CACHE_HIT_RATIO.set_function(self.pk_cache.hit_ratio)
+        OPEN_ACCUMULATORS.set_function(self.acc.open_count)
+        STORE_BYTES.set_function(lambda: path_size(self.acc.store.path), "accumulator")
+        STORE_BYTES.set_function(lambda: path_size(self.sim_store.path), "simulations")
+        LOG_DROPPED.set_function(dropped_records)
+        SSE_SUBSCRIBERS.set_function(self.events.subscribers)
+        CIRCUIT_STATE.set_function(lambda: self.authority.breaker.state, "authority")
+        for scope in ("global", "election"):
+            ADMISSION_INFLIGHT.set_function(lambda scope=scope: self.admission.inflight(scope), scope)
+            ADMISSION_QUEUED.set_function(lambda scope=scope: self.admission.queued(scope), scope)
+            ADMISSION_SHED.set_function(lambda scope=scope: self.admission.shed(scope), scope)
 
         # endpoints per-elezione
         self.router.post("/elections/vote")(self.submit_vote)
+        self.router.post("/elections/vote/batch")(self.submit_vote_batch)
         self.router.post("/elections/result")(self.get_result)
+        self.router.post("/elections/result/batch")(self.get_results_batch)
+        self.router.get("/elections/{votazione_id}/stream")(self.stream_election)
 
         self.router.get("/elections/users")(self.list_non_admin_users)
         self.router.post("/elections/users/category")(self.update_user_category)
@@ -110,6 +302,34 @@ class VotingSystemAPI:
         self.router.post("/simulation")(self.start_simulation)
         self.router.post("/simulation/end")(self.end_simulation)
 
+    async def metrics(self):
+        """
+        Metriche in formato Prometheus (latenze per fase, voti accettati/rifiutati, cache chiavi, accumulatori)
+        """
+        return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    async def startup(self):
+        """
+        Avvio dell'app (lifespan): apre i client HTTP condivisi verso gli upstream e il writer dell'accumulatore
+        """
+        start_logging()
+        self.http.start()
+        await self.acc.start()
+
+    async def shutdown(self):
+        """
+        Arresto dell'app (lifespan): scrive i voti in coda e chiude le connessioni keep-alive verso gli upstream
+        """
+        await self.acc.stop()
+        await self.http.aclose()
+        db.shutdown()
+        for pool in self.obf_pools.values():
+            pool.close()
+        self.obf_pools.clear()
+        if self._encrypt_pool is not None:
+            self._encrypt_pool.shutdown(wait=False, cancel_futures=True)
+            self._encrypt_pool = None
+        stop_logging()
 
     # ---------------------------------------------------------------------
     # KEY MANAGEMENT (per elezione)
@@ -128,14 +348,15 @@ class VotingSystemAPI:
         :return public_key:
         """
         try:
-            async with httpx.AsyncClient(base_url=AUTH_BASE, timeout=30.0) as client:
-
-                resp = await client.post(f"elections", json={"votazione_id": f"{votazione_id}"})
-                return PublicKeyResponse(**resp.json())
-
-        except Exception as e:
-            logging.info("KeyError: Elezione non trovata/inizializzata")
-            raise HTTPException(status_code=404, detail="Elezione non trovata o non inizializzata: " + str(e))
+            # niente hedging: la prima richiesta genera la coppia di chiavi e due creazioni concorrenti
+            # sull'Authority potrebbero produrre chiavi diverse per la stessa votazione
+            resp = await self.authority.post("elections", {"votazione_id": f"{votazione_id}"}, hedge=False)
+            return PublicKeyResponse(**resp.json())
+        except UpstreamError as e:
+            logging.info("KeyError: chiave pubblica non disponibile %s", e)
+            raise self._authority_error(e, "Elezione non trovata o non inizializzata")
+        except ValueError as e:
+            raise HTTPException(status_code=502, detail=f"Risposta dell'Authority non valida: {e}")
 
     async def get_decrypt_tally(self, votazione_id, ciphertext):
         """
@@ -145,18 +366,63 @@ class VotingSystemAPI:
         :return decrypt_tally:
         """
         try:
-            async with httpx.AsyncClient(base_url=AUTH_BASE, timeout=30.0) as client:
-                payload = DecryptTallyModel(
-                    votazione_id=votazione_id,
-                    ciphertext_sum=ciphertext
-                )
-                resp = await client.post(f"elections/decrypt_tally", json=payload.model_dump())
-                resp_body = resp.json()
-                return DecryptTallyResponse(**resp_body)
-
-        except Exception as e:
-            logging.info("DecryptError: Decifratura non riuscita")
-            raise HTTPException(status_code=404, detail="Decifratura non riuscita: " + str(e))
+            payload = DecryptTallyModel(
+                votazione_id=votazione_id,
+                ciphertext_sum=ciphertext
+            )
+            resp = await self.authority.post("elections/decrypt_tally", payload.model_dump())
+            return DecryptTallyResponse(**resp.json())
+        except UpstreamError as e:
+            logging.info("DecryptError: Decifratura non riuscita %s", e)
+            raise self._authority_error(e, "Decifratura non riuscita")
+        except ValueError as e:
+            raise HTTPException(status_code=502, detail=f"Decifratura non riuscita, risposta non valida: {e}")
+
+    async def get_decrypt_tally_batch(self, sums: dict[str, int]) -> dict[str, int | HTTPException]:
+        """
+        Decifra più somme con una sola richiesta al server Authority (elections/decrypt_tally/batch,
+        esposto solo da AuthorityStub: vedi AUTH_BATCH_DECRYPT)
+        :param sums: votazione_id -> somma cifrata
+        :return votazione_id -> somma decriptata oppure HTTPException:
+        """
+        payload = {"items": [DecryptTallyModel(votazione_id=int(v), ciphertext_sum=c).model_dump()
+                             for v, c in sums.items()]}
+        try:
+            resp = await self.authority.post("elections/decrypt_tally/batch", payload)
+            items = [DecryptTallyBatchItem(**r) for r in resp.json()["results"]]
+        except UpstreamError as e:
+            logging.info("DecryptError: Decifratura batch non riuscita %s", e)
+            error = self._authority_error(e, "Decifratura non riuscita")
+            return {v: error for v in sums}
+        except (ValueError, KeyError, TypeError) as e:
+            error = HTTPException(status_code=502, detail=f"Decifratura non riuscita, risposta non valida: {e}")
+            return {v: error for v in sums}
+
+        decrypted: dict[str, int | HTTPException] = {}
+        for item in items:
+            if item.status_code == 200 and item.plain_sum is not None:
+                decrypted[str(item.votazione_id)] = item.plain_sum
+            else:
+                status = 404 if item.status_code == 404 else 502
+                decrypted[str(item.votazione_id)] = HTTPException(status_code=status,
+                                                                  detail=f"Decifratura non riuscita: {item.detail}")
+        missing = HTTPException(status_code=502, detail="Decifratura non riuscita: votazione assente nella risposta")
+        return {v: decrypted.get(v, missing) for v in sums}
+
+    @staticmethod
+    def _authority_error(e: UpstreamError, detail: str) -> HTTPException:
+        """
+        Errore dell'Authority -> risposta del client: 404 se l'Authority non conosce la votazione,
+        503 + Retry-After con il circuito aperto, 502 per le altre risposte di errore, 504 per timeout e rete
+        """
+        if isinstance(e, CircuitOpenError):
+            return HTTPException(status_code=503, headers={"Retry-After": str(int(e.retry_after or 1))},
+                                 detail=f"{detail}: Authority non disponibile")
+        if e.status_code == 404:
+            return HTTPException(status_code=404, detail=f"{detail}: {e.detail}")
+        if e.status_code is not None:
+            return HTTPException(status_code=502, detail=f"{detail}: Authority HTTP {e.status_code} {e.detail}")
+        return HTTPException(status_code=504, detail=f"{detail}: {e.detail}")
 
     async def new_categoria(self, payload: NewCategoriaModel):
         """
@@ -166,7 +432,8 @@ class VotingSystemAPI:
         """
         nome = payload.nome
         try:
-            create_categoria(nome)
+            await db.create_categoria(nome)
+            self.categorie_cache.bump()
         except Exception as e:
             raise HTTPException(status_code=500, detail="Categoria non creata: "+ str(e))
 
@@ -177,38 +444,227 @@ class VotingSystemAPI:
         :param body:
         :return status:
         """
+        t0 = time.perf_counter()
         try:
             votazione_id = str(body.votazione_id)
             c_int = int(body.ciphertext)
         except Exception as e:
-            logging.info("Exception: Payload non valido" + str(e))
+            logging.info("Exception: Payload non valido %s", e)
+            VOTES_REJECTED.labels(self._metric_id(body.votazione_id), "payload").inc()
             raise HTTPException(status_code=400, detail=f"Payload non valido: {e}")
+        VOTE_PARSE.observe(time.perf_counter() - t0)
 
-        #carico la chiave pubblica per la votazione con id votazione_id
+        async with self._admit(votazione_id):
+            acc_count = await self._aggregate(votazione_id, c_int)
+        vote_log.info("num_utenti: %s acc_count: %s", body.num_utenti, acc_count,
+                      extra={"votazione_id": votazione_id, "num_utenti": body.num_utenti, "acc_count": acc_count})
 
-        pk_model = await self.get_pk(votazione_id)
-        pk = paillier.PaillierPublicKey(n=int(pk_model.n))
-
-        # ricostruisco l'EncryptedNumber
-        enc_vote = paillier.EncryptedNumber(pk, c_int, 0)
-
-        # aggregazione: somma dei ciphertext
-        current = self.acc.get(votazione_id)
-        if current is None:
-            # primo voto: salva direttamente
-            self.acc.set(votazione_id, enc_vote.ciphertext(), enc_vote.exponent, 1)
-            current = self.acc.get(votazione_id)
-        else:
-            #successivamente: prende dal file la somma omomorfica attuale e la aggiorna
-            acc_c, acc_exp, acc_count = current
-            acc = paillier.EncryptedNumber(pk, acc_c, acc_exp)
-            updated = acc + enc_vote
-            self.acc.set(votazione_id, updated.ciphertext(), updated.exponent, acc_count + 1)
+        return {"status": "ok"}
 
-        acc_c, acc_exp, acc_count = current
-        logging.info("num_utenti: " + str(body.num_utenti) + " acc_count: " + str(acc_count))
+    async def _aggregate(self, votazione_id: str, c_int: int, auto_tally: bool = True) -> int:
+        """
+        Aggiunge un voto cifrato all'accumulatore della votazione (usato da submit_vote e dalle simulazioni).
+        Con auto_tally, raggiunti i votanti attesi lo scrutinio parte in background.
+        :return numero di voti accumulati:
+        """
+        #carico la chiave pubblica per la votazione con id votazione_id (dalla cache se presente)
+        t0 = time.perf_counter()
+        try:
+            key = await self.pk_cache.get(votazione_id)
+        except ValueError as e:
+            logging.info("KeyError: chiave pubblica non valida %s", e)
+            VOTES_REJECTED.labels(self._metric_id(votazione_id), "key").inc()
+            raise HTTPException(status_code=502, detail=f"Chiave pubblica non valida: {e}")
+        except HTTPException:
+            VOTES_REJECTED.labels(self._metric_id(votazione_id), "key").inc()
+            raise
+        t1 = time.perf_counter()
+        VOTE_PK_FETCH.observe(t1 - t0)
+
+        c = PaillierKernel.to_native(c_int)
+        if not key.raw.check(c):
+            VOTES_REJECTED.labels(self._metric_id(votazione_id), "range").inc()
+            raise HTTPException(status_code=400, detail="Payload non valido: ciphertext fuori dall'intervallo (0, n²)")
+
+        # aggregazione: somma dei ciphertext (prodotto mod n²), eseguita con il lock della votazione
+        # il voto è confermato solo quando il batch che lo contiene è stato scritto su disco
+        combine = self._combiner(key, c, 1)
+        try:
+            acc_c, acc_exp, acc_count = await self.acc.update(votazione_id, combine)
+        except PERSIST_ERRORS as e:
+            logging.info("Exception: Persistenza voto non riuscita %s", e)
+            VOTES_REJECTED.labels(self._metric_id(votazione_id), "persist").inc()
+            raise HTTPException(status_code=503, detail=f"Voto non registrato: {e}")
+        # persist: attesa del lock e del group commit, esclusa la somma omomorfica
+        VOTE_ADD.observe(combine.elapsed)
+        VOTE_PERSIST.observe(time.perf_counter() - t1 - combine.elapsed)
+        VOTES_ACCEPTED.labels(self._metric_id(votazione_id)).inc()
+        self.events.publish(votazione_id, acc_count=acc_count)
+        if auto_tally:
+            self._check_auto_tally(votazione_id, acc_count)
+        return acc_count
+
+    async def submit_vote_batch(self, body: SubmitVoteBatchBody):
+        """
+        Riceve molti ciphertext (anche di votazioni diverse) in un'unica richiesta, es. da relay/chioschi offline.
+        Per ogni votazione: una sola richiesta della chiave, somma ad albero dei ciphertext
+        e un solo aggiornamento dell'accumulatore.
+        :param body:
+        :return status e risultato per ogni voto (stesso ordine della richiesta):
+        """
+        if not body.votes:
+            raise HTTPException(status_code=400, detail="Payload non valido: nessun voto")
+        if len(body.votes) > VOTE_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"Payload non valido: più di {VOTE_BATCH_MAX} voti")
+        return await self._submit_vote_batch(body)
+
+    async def _submit_vote_batch(self, body: SubmitVoteBatchBody):
+        results: list[BatchVoteResult | None] = [None] * len(body.votes)
+        by_election: dict[str, list[tuple[int, str]]] = {}
+        for i, item in enumerate(body.votes):
+            by_election.setdefault(str(item.votazione_id), []).append((i, item.ciphertext))
+
+        # un errore imprevisto in una votazione non annulla l'esito delle altre (già registrate)
+        outcomes = await asyncio.gather(*(
+            self._admit_batch(votazione_id, items, results)
+            for votazione_id, items in by_election.items()
+        ), return_exceptions=True)
+        for (votazione_id, items), outcome in zip(by_election.items(), outcomes):
+            if isinstance(outcome, BaseException):
+                logging.info("Exception: Aggregazione batch votazione %s non riuscita %s", votazione_id, outcome)
+                for i, _ in items:
+                    # i voti già confermati restano "ok": l'errore riguarda solo quelli senza esito
+                    if results[i] is None:
+                        results[i] = BatchVoteResult(votazione_id=int(votazione_id), status="error",
+                                                     detail=f"Voto non registrato: {outcome}")
+
+        accepted = sum(1 for r in results if r.status == "ok")
+        logging.info("Batch voti: %d accettati, %d rifiutati", accepted, len(results) - accepted)
+        return {"status": "ok", "accepted": accepted, "rejected": len(results) - accepted, "results": results}
+
+    async def _admit_batch(self, votazione_id: str, items: list[tuple[int, str]], results: list):
+        """
+        Ogni votazione del batch passa dai limiti globali e della votazione come un voto singolo
+        (chiave e accumulatore sono aggiornati una volta per votazione); se rifiutata i suoi voti risultano in errore
+        """
+        try:
+            async with self._admit(votazione_id):
+                await self._aggregate_batch(votazione_id, items, results)
+        except HTTPException as e:
+            if e.status_code not in (429, 503):
+                raise
+            for i, _ in items:
+                if results[i] is None:
+                    results[i] = BatchVoteResult(votazione_id=int(votazione_id), status="error", detail=str(e.detail))
+
+    async def _aggregate_batch(self, votazione_id: str, items: list[tuple[int, str]], results: list):
+        """
+        Aggrega i voti di una singola votazione del batch, scrivendo l'esito di ciascuno in results
+        """
+        vid = int(votazione_id)
+        try:
+            key = await self.pk_cache.get(votazione_id)
+        except HTTPException as e:
+            for i, _ in items:
+                results[i] = BatchVoteResult(votazione_id=vid, status="error", detail=str(e.detail))
+            VOTES_REJECTED.labels(self._metric_id(votazione_id), "key").inc(len(items))
+            return
+        except ValueError as e:
+            for i, _ in items:
+                results[i] = BatchVoteResult(votazione_id=vid, status="error",
+                                             detail=f"Chiave pubblica non valida: {e}")
+            VOTES_REJECTED.labels(self._metric_id(votazione_id), "key").inc(len(items))
+            return
+
+        valid: list[tuple[int, int]] = []
+        for i, ciphertext in items:
+            try:
+                c = PaillierKernel.to_native(int(ciphertext))
+                if not key.raw.check(c):
+                    raise ValueError("ciphertext fuori dall'intervallo (0, n²)")
+                valid.append((i, c))
+            except ValueError as e:
+                results[i] = BatchVoteResult(votazione_id=vid, status="error", detail=f"Payload non valido: {e}")
+                VOTES_REJECTED.labels(self._metric_id(votazione_id), "payload").inc()
+        if not valid:
+            return
+
+        combined = PaillierKernel.tree_sum([c for _, c in valid], key.raw.nsquare)
 
-        return {"status": "ok"}
+        try:
+            _, _, acc_count = await self.acc.update(votazione_id, self._combiner(key, combined, len(valid)))
+        except PERSIST_ERRORS as e:
+            logging.info("Exception: Persistenza batch votazione %s non riuscita %s", votazione_id, e)
+            for i, _ in valid:
+                results[i] = BatchVoteResult(votazione_id=vid, status="error", detail=f"Voto non registrato: {e}")
+            VOTES_REJECTED.labels(self._metric_id(votazione_id), "persist").inc(len(valid))
+            return
+        for i, _ in valid:
+            results[i] = BatchVoteResult(votazione_id=vid, status="ok")
+        VOTES_ACCEPTED.labels(self._metric_id(votazione_id)).inc(len(valid))
+        self.events.publish(votazione_id, acc_count=acc_count)
+        self._check_auto_tally(votazione_id, acc_count)
+
+    def _metric_id(self, votazione_id) -> str:
+        """
+        Label votazione_id delle metriche dei voti: l'id arriva dal client (e l'Authority crea chiavi su richiesta),
+        quindi hanno una serie propria solo le votazioni aperte note al processo (in expected), al più
+        METRICS_ELECTION_SERIES_MAX; tutte le altre finiscono in "other". Le serie non vengono mai rimosse,
+        così i contatori non ripartono da zero (rate()/increase() restano corretti).
+        """
+        vid = str(votazione_id)
+        if vid in self._metric_ids:
+            return vid
+        if vid in self.expected and len(self._metric_ids) < METRICS_ELECTION_SERIES_MAX:
+            self._metric_ids.add(vid)
+            return vid
+        return "other"
+
+    @contextlib.asynccontextmanager
+    async def _admit(self, votazione_id: str | None):
+        """
+        Admission control dei voti: con i posti e la coda esauriti rifiuta subito la richiesta
+        con 503 (limite del processo) o 429 (limite della votazione) e l'header Retry-After
+        """
+        try:
+            async with self.admission.admit(votazione_id):
+                yield
+        except Overloaded as e:
+            if votazione_id is not None:
+                VOTES_REJECTED.labels(self._metric_id(votazione_id), "overload").inc()
+            status = 503 if e.scope == "global" else 429
+            raise HTTPException(status_code=status, headers={"Retry-After": str(e.retry_after)},
+                                detail=f"Servizio sovraccarico ({e.reason}), riprovare tra {e.retry_after}s")
+
+    @staticmethod
+    def _combiner(key, c, n_votes: int):
+        """
+        Restituisce la funzione di aggiornamento dell'accumulatore che aggiunge il ciphertext c (n_votes voti).
+        Lavora direttamente sugli interi con n² precalcolato; ricade su phe solo per accumulatori con esponente != 0.
+        Dopo l'esecuzione combine.elapsed contiene la durata della somma (metrica homomorphic_add).
+        """
+        nsquare = key.raw.nsquare
+
+        def combine(current):
+            t0 = time.perf_counter()
+            if current is None:
+                # primo voto: salva direttamente
+                new = c, 0, n_votes
+            else:
+                #successivamente: prende la somma omomorfica attuale e la aggiorna
+                acc_c, acc_exp, acc_count = current
+                if acc_exp != 0:
+                    pk = key.public_key
+                    updated = (paillier.EncryptedNumber(pk, int(acc_c), acc_exp)
+                               + paillier.EncryptedNumber(pk, int(c), 0))
+                    new = updated.ciphertext(), updated.exponent, acc_count + n_votes
+                else:
+                    new = PaillierKernel.add(acc_c, c, nsquare), 0, acc_count + n_votes
+            combine.elapsed = time.perf_counter() - t0
+            return new
+
+        combine.elapsed = 0.0
+        return combine
 
     # ---------------------------------------------------------------------
     # TALLY
@@ -226,10 +682,400 @@ class VotingSystemAPI:
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Payload non valido: {e}")
 
+        return await self._tally(votazione_id, num_utenti_int)
+
+    async def get_results_batch(self, body: ResultBatchBody):
+        """
+        Scrutinio di più votazioni (es. chiusura di una sessione): una sola lettura delle righe,
+        decifrature verso l'Authority e aggiornamenti degli esiti in parallelo (al più RESULT_BATCH_CONCURRENCY).
+        Ogni votazione richiede num_utenti (come /elections/result) oppure force: true per chiuderla subito.
+        Le votazioni già in scrutinio vengono attese invece di essere decifrate di nuovo.
+        :param body:
+        :return esito per ogni votazione (stesso ordine della richiesta, senza duplicati):
+        """
+        if not body.votazioni:
+            raise HTTPException(status_code=400, detail="Payload non valido: nessuna votazione")
+        if len(body.votazioni) > RESULT_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"Payload non valido: più di {RESULT_BATCH_MAX} votazioni")
+
+        # soglia di voti per votazione (0 con force: chiusa con i voti ricevuti)
+        thresholds: dict[str, int] = {}
+        for item in body.votazioni:
+            if item.force:
+                num = 0
+            elif item.num_utenti is not None:
+                num = item.num_utenti
+            else:
+                raise HTTPException(status_code=400,
+                                    detail="Payload non valido: num_utenti o force mancante "
+                                           f"per la votazione {item.votazione_id}")
+            votazione_id = str(item.votazione_id)
+            if thresholds.setdefault(votazione_id, num) != num:
+                raise HTTPException(status_code=400,
+                                    detail=f"Payload non valido: votazione {votazione_id} ripetuta con soglie diverse")
+
+        pending: dict[str, int] = {}
+        futures: dict[str, asyncio.Future] = {}
+        for votazione_id, num in thresholds.items():
+            if self.results.get(votazione_id) is None and votazione_id not in self._tallies:
+                pending[votazione_id] = num
+        if pending:
+            # ogni votazione del batch risulta in scrutinio: get_result concorrenti attendono questo esito
+            loop = asyncio.get_running_loop()
+            for votazione_id in pending:
+                fut = futures[votazione_id] = loop.create_future()
+                self._tallies[votazione_id] = (fut, pending[votazione_id])
+                fut.add_done_callback(lambda f, v=votazione_id: self._tally_done(v, f))
+            task = asyncio.create_task(self._run_tally_batch(pending, futures))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            # shield: se il richiedente si disconnette lo scrutinio prosegue
+            await asyncio.shield(task)
+
+        async def outcome(votazione_id: str, num: int) -> ResultBatchResult:
+            vid = int(votazione_id)
+            try:
+                # le votazioni del batch hanno già l'esito; le altre sono in cache o in uno scrutinio in corso
+                fut = futures.get(votazione_id)
+                result = fut.result() if fut is not None else await self._tally(votazione_id, num)
+            except HTTPException as e:
+                return ResultBatchResult(votazione_id=vid, status="error", detail=str(e.detail))
+            return ResultBatchResult(votazione_id=vid, status=result["status"],
+                                     si=result.get("si"), no=result.get("no"))
+
+        results = await asyncio.gather(*(outcome(v, num) for v, num in thresholds.items()))
+        concluded = sum(1 for r in results if r.status == "ok")
+        logging.info("Scrutinio batch: %d votazioni, %d concluse", len(results), concluded)
+        return {"status": "ok", "concluded": concluded, "results": results}
+
+    async def _run_tally_batch(self, pending: dict[str, int], futures: dict[str, asyncio.Future]):
+        """
+        Come _run_tally per più votazioni; l'esito (dict o HTTPException) di ciascuna va nel relativo future
+        """
+        outcomes: dict[str, dict | HTTPException] = {}
+        try:
+            t0 = time.perf_counter()
+            try:
+                rows = await db.get_elections([int(v) for v in pending])
+            except RuntimeError as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            RESULT_DB_READ.observe(time.perf_counter() - t0)
+            by_id = {str(row["id"]): row for row in rows}
+
+            ready: dict[str, tuple[dict, tuple]] = {}
+            for votazione_id, num in pending.items():
+                row = by_id.get(votazione_id)
+                if row is None:
+                    outcomes[votazione_id] = HTTPException(status_code=404, detail="Votazione non trovata")
+                elif row.get("concluded"):
+                    outcomes[votazione_id] = {"status": "ok", "si": str(row.get("si")), "no": str(row.get("no"))}
+                else:
+                    current = await self.acc.get(votazione_id)
+                    if current is None:
+                        outcomes[votazione_id] = HTTPException(404, "Nessun voto per questa elezione")
+                    elif current[2] < num:
+                        outcomes[votazione_id] = {"status": "Votazione non conclusa"}
+                    else:
+                        ready[votazione_id] = (row, current)
+
+            # richieste di decifratura al server Authority: una sola se supporta il batch (AuthorityStub),
+            # altrimenti una per votazione, in parallelo ma limitate
+            limit = asyncio.Semaphore(max(1, RESULT_BATCH_CONCURRENCY))
+
+            async def decrypt(votazione_id: str, acc_c) -> int:
+                async with limit:
+                    t = time.perf_counter()
+                    tally_model = await self.get_decrypt_tally(votazione_id, int(acc_c))
+                    RESULT_DECRYPT.observe(time.perf_counter() - t)
+                    return tally_model.plain_sum
+
+            if AUTH_BATCH_DECRYPT and ready:
+                t = time.perf_counter()
+                decrypted = await self.get_decrypt_tally_batch(
+                    {v: int(current[0]) for v, (_, current) in ready.items()})
+                RESULT_DECRYPT.observe(time.perf_counter() - t)
+                sums = [decrypted[v] for v in ready]
+            else:
+                sums = await asyncio.gather(*(decrypt(v, current[0]) for v, (_, current) in ready.items()),
+                                            return_exceptions=True)
+            updates = []
+            for (votazione_id, (row, current)), yes_total in zip(ready.items(), sums):
+                if isinstance(yes_total, HTTPException):
+                    outcomes[votazione_id] = yes_total
+                    continue
+                if isinstance(yes_total, BaseException):
+                    outcomes[votazione_id] = HTTPException(status_code=502,
+                                                           detail=f"Decifratura non riuscita: {yes_total}")
+                    continue
+                no_total = current[2] - yes_total
+                updates.append((votazione_id, yes_total, no_total))
+                outcomes[votazione_id] = {"status": "ok", "si": str(yes_total), "no": str(no_total)}
+
+            # solo UPDATE (mai INSERT): una votazione eliminata nel frattempo non viene ricreata
+            async def update(votazione_id: str, yes_total: int, no_total: int) -> bool:
+                async with limit:
+                    t = time.perf_counter()
+                    try:
+                        found = await db.update_election(int(votazione_id), yes_total, no_total, True)
+                    except RuntimeError as e:
+                        outcomes[votazione_id] = HTTPException(status_code=500, detail=f"Update non riuscito: {e}")
+                        return False
+                    RESULT_DB_UPDATE.observe(time.perf_counter() - t)
+                    if not found:
+                        outcomes[votazione_id] = HTTPException(status_code=404, detail="Votazione non trovata")
+                    return found
+
+            written = await asyncio.gather(*(update(*u) for u in updates))
+            concluded = [u[0] for u, ok in zip(updates, written) if ok]
+            if concluded:
+                self.elections_cache.bump()
+
+            #elimino i dati degli accumulatori e le chiavi in cache delle votazioni concluse
+            await asyncio.gather(*(self.acc.clear(votazione_id) for votazione_id in concluded))
+            for votazione_id in concluded:
+                self._forget_key(votazione_id)
+                self.expected.pop(votazione_id, None)
+            # i votanti attesi servono solo finché la votazione è aperta
+            await asyncio.to_thread(lambda: [self.elections_store.pop(v) for v in concluded])
+        except HTTPException as e:
+            for votazione_id in pending:
+                outcomes.setdefault(votazione_id, e)
+        except Exception as e:
+            logging.info("Exception: Scrutinio batch non riuscito %s", e)
+            for votazione_id in pending:
+                outcomes.setdefault(votazione_id, HTTPException(status_code=500, detail=f"Scrutinio non riuscito: {e}"))
+        finally:
+            for votazione_id, fut in futures.items():
+                outcome = outcomes.get(votazione_id, HTTPException(status_code=500, detail="Scrutinio interrotto"))
+                if fut.done():
+                    continue
+                if isinstance(outcome, HTTPException):
+                    fut.set_exception(outcome)
+                else:
+                    fut.set_result(outcome)
+
+    # ---------------------------------------------------------------------
+    # STREAM SSE
+    # ---------------------------------------------------------------------
+    async def stream_election(self, votazione_id: int):
+        """
+        Stream Server-Sent Events dello stato di una votazione: "count" con i voti ricevuti
+        (al più uno ogni SSE_COALESCE_MS), poi "result" con l'esito, dopo il quale lo stream si chiude;
+        la riconnessione automatica del client riceve 204 (votazione conclusa) e termina.
+        Sostituisce il polling di /elections/result e /elections/votazioni da parte delle dashboard.
+        """
+        vid = str(votazione_id)
+        # se altri client seguono già la votazione lo stato corrente è in memoria
+        initial = self.events.state(vid) or await self._stream_state(vid)
+        if initial.get("concluded"):
+            # 204: per la specifica SSE il client EventSource smette di riconnettersi
+            # (l'esito si legge da /elections/result)
+            return Response(status_code=204)
+        return StreamingResponse(
+            self._sse(vid, initial),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def _stream_state(self, votazione_id: str) -> dict:
+        """
+        Stato iniziale dello stream: esito in cache, altrimenti conteggio dell'accumulatore;
+        il database viene letto solo se la votazione non ha voti in memoria (nuova o già conclusa)
+        """
+        result = self.results.get(votazione_id)
+        if result is not None:
+            return {"votazione_id": int(votazione_id), "concluded": True, "si": result["si"], "no": result["no"]}
+        current = await self.acc.get(votazione_id)
+        if current is not None:
+            return {"votazione_id": int(votazione_id), "concluded": False, "acc_count": current[2]}
+        try:
+            row = await db.get_election_result(int(votazione_id))
+        except RuntimeError:
+            raise HTTPException(status_code=404, detail="Votazione non trovata")
+        if row.get("concluded"):
+            result = {"status": "ok", "si": str(row.get("si")), "no": str(row.get("no"))}
+            self.results.set(votazione_id, result)
+            return {"votazione_id": int(votazione_id), "concluded": True, "si": result["si"], "no": result["no"]}
+        return {"votazione_id": int(votazione_id), "concluded": False, "acc_count": 0}
+
+    async def _sse(self, votazione_id: str, initial: dict):
+        deadline = time.monotonic() + SSE_MAX_DURATION_S
+        # retry: attesa (ms) del client EventSource prima di riconnettersi
+        yield "retry: 3000\n\n"
+        async with contextlib.aclosing(self.events.subscribe(votazione_id, initial, SSE_HEARTBEAT_S)) as states:
+            first = True
+            async for state in states:
+                if first:
+                    first = False
+                    await self._stream_catch_up(votazione_id)
+                if state is None:
+                    yield ": ping\n\n"
+                elif state.get("concluded"):
+                    yield f"event: result\ndata: {json.dumps(state)}\n\n"
+                    return
+                else:
+                    yield f"event: count\ndata: {json.dumps(state)}\n\n"
+                # durata limitata: uno stream non resta aperto all'infinito (arresto del server, bilanciamento)
+                if time.monotonic() >= deadline:
+                    return
+
+    async def _stream_catch_up(self, votazione_id: str):
+        """
+        Chiamato appena lo stream è iscritto: pubblica voti o esito arrivati tra la lettura dello stato
+        iniziale e l'iscrizione (in quell'intervallo publish() non aveva destinatari)
+        """
+        current = await self.acc.get(votazione_id)
+        state = self.events.state(votazione_id) or {}
+        result = self.results.get(votazione_id)
+        if result is not None:
+            if not state.get("concluded"):
+                self.events.publish(votazione_id, concluded=True, si=result["si"], no=result["no"])
+        elif current is not None and current[2] > state.get("acc_count", 0):
+            self.events.publish(votazione_id, acc_count=current[2])
+
+    # ---------------------------------------------------------------------
+    # SCRUTINIO AUTOMATICO
+    # ---------------------------------------------------------------------
 
-        resp = get_election(int(votazione_id))
+    def _check_auto_tally(self, votazione_id: str, acc_count: int):
+        """
+        Chiamato dopo ogni voto accettato: se acc_count ha raggiunto i votanti attesi avvia lo scrutinio
+        in background. Solo lookup in memoria; i votanti attesi mancanti (es. dopo un riavvio)
+        vengono ricavati da un task separato.
+        """
+        if votazione_id in self._tallies or self.results.get(votazione_id) is not None:
+            return
+        if votazione_id not in self.expected:
+            if votazione_id not in self._expected_tasks and self._expected_retry.get(votazione_id) is None:
+                task = asyncio.create_task(self._resolve_expected(votazione_id))
+                self._expected_tasks[votazione_id] = task
+                task.add_done_callback(lambda _: self._expected_tasks.pop(votazione_id, None))
+            return
+        expected = self.expected[votazione_id]
+        if expected is None or acc_count < expected:
+            return
+        task = asyncio.create_task(self._auto_tally(votazione_id, expected))
+        # riferimento al task, per evitarne la garbage collection
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _auto_tally(self, votazione_id: str, expected: int):
+        try:
+            if not await self._expected_still_reached(votazione_id, expected):
+                return
+            result = await self._tally(votazione_id, expected)
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else e
+            logging.info("Scrutinio automatico votazione %s non riuscito: %s", votazione_id, detail)
+            return
+        if result.get("status") == "ok":
+            logging.info("Scrutinio automatico votazione %s: si=%s no=%s", votazione_id, result["si"], result["no"])
+
+    async def _resolve_expected(self, votazione_id: str):
+        """
+        Ricava i votanti attesi di una votazione non creata da questo processo: dal file locale se presente,
+        altrimenti contando gli utenti non admin della categoria; poi ricontrolla l'accumulatore
+        """
+        try:
+            meta = await asyncio.to_thread(self.elections_store.get, votazione_id)
+            if meta is None:
+                resp = await db.get_election(int(votazione_id))
+                row = resp.data[0] if resp.data else None
+                if row is None or row.get("concluded"):
+                    # nessuno scrutinio automatico; non tenuta in expected, che contiene solo votazioni aperte
+                    self._expected_retry.set(votazione_id, True)
+                    return
+                meta = await self._register_expected(votazione_id, row.get("categoria"), None)
+            self.expected[votazione_id] = meta.get("num_utenti")
+            if meta.get("admission"):
+                self.admission.configure(votazione_id, **meta["admission"])
+        except Exception as e:
+            # nuovo tentativo dopo EXPECTED_RETRY_S secondi, non a ogni voto
+            logging.info("Votanti attesi della votazione %s non disponibili: %s", votazione_id, e)
+            self._expected_retry.set(votazione_id, True)
+            return
+        current = await self.acc.get(votazione_id)
+        if current is not None:
+            self._check_auto_tally(votazione_id, current[2])
+
+    async def _register_expected(self, votazione_id: str, categoria: str | None, num_utenti: int | None,
+                                 admission: dict | None = None) -> dict:
+        """
+        Registra i votanti attesi: num_utenti esplicito oppure gli utenti non admin della categoria in questo momento
+        (from_categoria, ricontrollati da _expected_still_reached prima della chiusura).
+        admission: limiti specifici della votazione, salvati con i metadati per i riavvii
+        """
+        from_categoria = num_utenti is None and bool(categoria)
+        if from_categoria:
+            num_utenti = await db.count_eligible_users(categoria)
+        meta = {"num_utenti": num_utenti if num_utenti and num_utenti > 0 else None, "categoria": categoria,
+                "from_categoria": from_categoria}
+        if admission:
+            meta["admission"] = admission
+        await asyncio.to_thread(self.elections_store.set, votazione_id, meta)
+        self.expected[votazione_id] = meta["num_utenti"]
+        return meta
+
+    async def _expected_still_reached(self, votazione_id: str, expected: int) -> bool:
+        """
+        I votanti ricavati dalla categoria sono quelli al momento della creazione: prima di chiudere la votazione
+        li riconto, così un utente aggiunto nel frattempo alla categoria non resta escluso
+        """
+        meta = await asyncio.to_thread(self.elections_store.get, votazione_id)
+        if not meta or not meta.get("from_categoria") or not meta.get("categoria"):
+            return True
+        current = await db.count_eligible_users(meta["categoria"])
+        if current <= expected:
+            return True
+        meta["num_utenti"] = current
+        await asyncio.to_thread(self.elections_store.set, votazione_id, meta)
+        self.expected[votazione_id] = current
+        logging.info("Votanti attesi della votazione %s aggiornati: %s -> %s", votazione_id, expected, current)
+        acc = await self.acc.get(votazione_id)
+        return acc is not None and acc[2] >= current
+
+    async def _tally(self, votazione_id: str, num_utenti_int: int) -> dict:
+        """
+        Scrutinio con single-flight: richieste concorrenti per la stessa votazione condividono un'unica
+        decifratura; l'esito delle votazioni concluse resta in memoria (usato da get_result, scrutinio
+        automatico e simulazioni)
+        """
+        while True:
+            cached = self.results.get(votazione_id)
+            if cached is not None:
+                return cached
+            inflight = self._tallies.get(votazione_id)
+            if inflight is None:
+                task = asyncio.create_task(self._run_tally(votazione_id, num_utenti_int))
+                self._tallies[votazione_id] = (task, num_utenti_int)
+                task.add_done_callback(lambda t: self._tally_done(votazione_id, t))
+                # shield: se il richiedente si disconnette lo scrutinio prosegue per gli altri
+                return await asyncio.shield(task)
+            task, shared_num = inflight
+            result = await asyncio.shield(task)
+            # uno scrutinio avviato con una soglia più alta può non essere concluso anche se per
+            # num_utenti_int lo sarebbe: in quel caso riprovo con la mia soglia
+            if result.get("status") == "ok" or num_utenti_int >= shared_num:
+                return result
+
+    def _tally_done(self, votazione_id: str, task: asyncio.Future):
+        inflight = self._tallies.get(votazione_id)
+        if inflight is not None and inflight[0] is task:
+            del self._tallies[votazione_id]
+        if not task.cancelled() and task.exception() is None and task.result().get("status") == "ok":
+            result = task.result()
+            self.results.set(votazione_id, result)
+            self.events.publish(votazione_id, concluded=True, si=result["si"], no=result["no"])
+
+    async def _run_tally(self, votazione_id: str, num_utenti_int: int) -> dict:
+        """
+        Se sono arrivati almeno num_utenti_int voti decifra la somma, la salva sul database e svuota l'accumulatore
+        """
+        t0 = time.perf_counter()
+        resp = await db.get_election(int(votazione_id))
+        RESULT_DB_READ.observe(time.perf_counter() - t0)
         row = resp.data
-        if row is None:
+        if not row:
             raise HTTPException(status_code=404, detail="Votazione non trovata")
         conclusa = bool(row[0].get("concluded"))
         si = str(row[0].get("si"))
@@ -243,7 +1089,7 @@ class VotingSystemAPI:
                 }
 
 
-        current = self.acc.get(votazione_id)
+        current = await self.acc.get(votazione_id)
         if current is None:
             raise HTTPException(404, "Nessun voto per questa elezione")
 
@@ -254,18 +1100,26 @@ class VotingSystemAPI:
             acc_c, acc_exp, count = current
 
             #richiesta di decifratura al server Authority
-            tally_model = await self.get_decrypt_tally(votazione_id, acc_c)
+            t0 = time.perf_counter()
+            tally_model = await self.get_decrypt_tally(votazione_id, int(acc_c))
+            RESULT_DECRYPT.observe(time.perf_counter() - t0)
 
             yes_total = tally_model.plain_sum
             no_total = count - yes_total
 
+            t0 = time.perf_counter()
             try:
-                update_election(int(votazione_id), yes_total, no_total, True)
+                await db.update_election(int(votazione_id), yes_total, no_total, True)
+                self.elections_cache.bump()
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Update non riuscito: {e}")
+            RESULT_DB_UPDATE.observe(time.perf_counter() - t0)
 
-            #elimino i dati dell'accumulatore relativi alla votazione conclusa
-            self.acc.clear(votazione_id)
+            #elimino i dati dell'accumulatore e la chiave in cache relativi alla votazione conclusa
+            await self.acc.clear(votazione_id)
+            self._forget_key(votazione_id)
+            self.expected.pop(votazione_id, None)
+            await asyncio.to_thread(self.elections_store.pop, votazione_id)
             return {
                 "status": "ok",
                     "si": str(yes_total),
@@ -282,28 +1136,60 @@ class VotingSystemAPI:
     # ================== ENDPOINTS UTENTI (DB via UserFunctions) ==================
 
 
-    async def list_non_admin_users(self):
+    async def list_non_admin_users(self, response: Response,
+                                   limit: int | None = Query(None, ge=1, le=USERS_PAGE_MAX),
+                                   cursor: str | None = None, categoria: str | None = None):
         """
-        Restituisce la lista di utenti non admin
+        Restituisce la lista di utenti non admin, filtrata lato server (admin esclusi, categoria opzionale).
+        Con limit restituisce una pagina ordinata per id: se ci sono altri utenti l'header X-Next-Cursor
+        contiene il cursor da passare alla richiesta successiva. Senza limit restituisce tutti gli utenti.
         :return user_model:
         """
-        status, users = get_all_users()
-        if not status or status.get("status") != "ok":
-            msg = status.get("message", "Errore nel recupero utenti") if isinstance(status, dict) else "Errore nel recupero utenti"
-            raise HTTPException(status_code=500, detail=msg)
-
+        key = (limit, cursor, categoria)
+        page = self.users_cache.get(key)
+        if page is None:
+            generation = self.users_cache.generation
+            try:
+                page = await self._load_users(limit, cursor, categoria)
+            except RuntimeError as e:
+                raise HTTPException(status_code=500, detail=str(e))
+            self.users_cache.set(key, page, generation)
+
+        user_model, next_cursor = page
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return user_model
 
-        user_model = []
-        for user in users:
-            user_model.append(User(
-                    id=str(user.get("id")),
-                    nome=str(user.get("nome")) or "",
-                    cognome=str(user.get("cognome")) or "",
-                    categoria=str(user.get("categoria")) or "",
+    async def _load_users(self, limit: int | None, cursor: str | None, categoria: str | None):
+        """
+        Legge gli utenti non admin a pagine di USERS_PAGE_MAX righe (keyset su id)
+        :return (lista di User, cursor della pagina successiva o None):
+        """
+        generation = self.users_cache.generation
+        admin_ids = self.users_cache.get("admin_ids")
+        if admin_ids is None:
+            admin_ids = await db.get_admin_ids()
+            self.users_cache.set("admin_ids", admin_ids, generation)
+
+        users: list[User] = []
+        while True:
+            # una riga in più per sapere se esiste una pagina successiva
+            batch = USERS_PAGE_MAX if limit is None else min(USERS_PAGE_MAX, limit - len(users) + 1)
+            rows = await db.list_users_page(batch, cursor, categoria, admin_ids)
+            for row in rows:
+                users.append(User(
+                    id=str(row.get("id")),
+                    nome=str(row.get("nome")) or "",
+                    cognome=str(row.get("cognome")) or "",
+                    categoria=str(row.get("categoria")) or "",
                     is_admin=False
                 ))
-
-        return user_model
+            if len(rows) < batch:
+                return users, None
+            cursor = str(rows[-1].get("id"))
+            if limit is not None and len(users) > limit:
+                users = users[:limit]
+                return users, users[-1].id
 
 
     async def update_user_category(self, body: UserCategoryUpdate):
@@ -318,7 +1204,8 @@ class VotingSystemAPI:
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Payload non valido: {e}")
 
-        res = change_categoria(user_id, categoria)
+        res = await db.change_categoria(user_id, categoria)
+        self.users_cache.clear()
         if not res or res.get("status") != "ok":
             msg = res.get("message", "Impossibile aggiornare la categoria") if isinstance(res, dict) else "Impossibile aggiornare la categoria"
             raise HTTPException(status_code=400, detail=msg)
@@ -338,7 +1225,8 @@ class VotingSystemAPI:
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Payload non valido: {e}")
 
-        res = delete_user(user_id)
+        res = await db.delete_user(user_id)
+        self.users_cache.clear()
         status = res.get("status")
         if not res or status != "ok":
             msg = f"Impossibile eliminare l'utente {user_id} causa {status}"
@@ -348,16 +1236,33 @@ class VotingSystemAPI:
 
     # ================== VOTAZIONI (DB) ==================
 
-    async def list_all_votes(self):
+    async def list_all_votes(self, if_none_match: str | None = Header(None)):
         """
-        Restituisce la lista di tutte le votazioni effettuate
+        Restituisce la lista di tutte le votazioni effettuate (304 se l'ETag del client è ancora valido)
         :return [VoteModel]:
         """
+        async def load():
+            return [v.model_dump() for v in await db.list_elections()]
+
         try:
-             return list_elections()
+            return await self._cached_list(self.elections_cache, load, if_none_match)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @staticmethod
+    async def _cached_list(cache: VersionedCache, load, if_none_match: str | None) -> Response:
+        """
+        Risponde con il JSON in cache (serializzato una volta per versione) oppure con 304:
+        se la versione in cache è quella del client non vengono toccati né il database né il body
+        """
+        cached = cache.current()
+        if cached is None:
+            cached = await cache.get(load)
+        headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, cached.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=cached.body, media_type="application/json", headers=headers)
+
 
 
     # ================== SIMULAZIONE (usa i NUOVI endpoint per-elezione) ==================
@@ -367,16 +1272,18 @@ class VotingSystemAPI:
 
         Flusso:
           1) Crea la votazione (tabella 'votazioni') -> prendi id come votazione_id.
-          2) Crea 'count' utenti fittizi con la stessa categoria condivisa.
-          3) Richiesta al server Authority per la chiave pubblica.
-          4) Per ogni utente: genera voto 0/1, cifra e POST /api/elections/vote {election_id, ciphertext, topic, num_utenti}.
-          5) POST /api/elections/result {voatzione_id, num_utenti} -> decritta e scrive si/no/concluded in DB.
+          2) Richiesta al server Authority per la chiave pubblica e avvio del precalcolo degli offuscatori.
+          3) Crea 'count' utenti fittizi con la stessa categoria condivisa (in parallelo, profili con un solo upsert).
+          4) Per ogni utente: genera voto 0/1, cifra con gli offuscatori precalcolati e lo aggrega in-process
+             con lo stesso codice di /elections/vote.
+          5) Come /elections/result (in-process) -> decritta e scrive si/no/concluded in DB.
           6) Leggi i risultati da 'votazioni' e ritorna tutto.
+        Con mode="synthetic" non vengono creati utenti: vedi _start_synthetic_simulation.
         :param body:
         :return SimulationResponse{}:
         """
 
-        simulation_id = self.sim_store.next_id()
+        simulation_id = await asyncio.to_thread(self.sim_store.next_id)
         try:
             count = body.count
             topic = body.topic or f"Simulazione {simulation_id}"
@@ -384,13 +1291,24 @@ class VotingSystemAPI:
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Payload non valido: {e}")
 
+        if body.mode == "synthetic":
+            if count < SIM_SYNTHETIC_MIN or count > SIM_SYNTHETIC_MAX:
+                raise HTTPException(status_code=400,
+                                    detail=f"count deve essere tra {SIM_SYNTHETIC_MIN} e {SIM_SYNTHETIC_MAX}")
+            return await self._start_synthetic_simulation(simulation_id, count, topic, categoria, body.seed)
+        if body.mode != "accounts":
+            raise HTTPException(status_code=400, detail=f"mode non valido: {body.mode}")
+
         if count < 10 or count > 30:
             raise HTTPException(status_code=400, detail="count deve essere tra 10 e 30")
 
+        generated_users: list[User] = []
+        user_ids: list[str] = []
         try:
             # 1) crea votazione per categoria
-            v_res = insert_election(topic, categoria)
-            logging.info(v_res)
+            v_res = await db.insert_election(topic, categoria)
+            self.elections_cache.bump()
+            logging.info("%s", v_res)
             votazione_id = int(v_res.get("id"))
 
             if not v_res or votazione_id is None:
@@ -402,77 +1320,29 @@ class VotingSystemAPI:
                 "topic": topic,
                 "user_ids": None
             }
-            self.sim_store.set(simulation_id, payload)
+            await asyncio.to_thread(self.sim_store.set, simulation_id, payload)
 
-            # 2) crea utenti fittizi
-            generated_users: list[User] = []
-            user_ids: list[str] = []
-            for i in range(body.count):
-                nome, cognome = rand_name()
-                email = make_email(nome, cognome, simulation_id, i)
-                password = rand_password()
-                if not is_valid_email(email):
-                    email = make_email(nome.replace(" ", ""), cognome.replace(" ", ""), simulation_id, i)
+            #2)richiesta della chiave pubblica (condivisa con submit_vote tramite la cache):
+            # gli offuscatori vengono precalcolati mentre si creano gli utenti
+            key = await self.pk_cache.get(votazione_id)
+            obf_pool = self._obfuscation_pool(votazione_id, key, expected=count)
 
-                uid = create_auth_user(email, password, simulation_id)
-                logging.info(f"uid generato: {uid}")
+            # 3) crea utenti fittizi
+            await self._provision_users(simulation_id, count, categoria, payload, generated_users, user_ids)
 
-                supabase.table("profiles").update({
-                    "nome": nome, "cognome": cognome, "categoria": categoria
-                }).eq("id", uid).execute()
+            #4)Voto casuale 0/1 per ogni utente generato, cifrato fuori dall'event loop e aggregato in-process
+            total = body.count
+            votes = [random.choice([0, 1]) for _uid in user_ids]
+            ciphertexts = await obf_pool.encrypt_many(votes)
+            await asyncio.gather(*(self._aggregate(str(votazione_id), c, auto_tally=False) for c in ciphertexts))
+
+            #5)Decifra e salva i risultati come /result
+            r_res = await self._tally(str(votazione_id), total)
+            if r_res.get("status") != "ok":
+                raise RuntimeError(f"Errore get_result: {r_res}")
 
-                new_user = User(
-                    id=uid, nome=nome, cognome=cognome, categoria=categoria
-                )
-                generated_users.append(new_user)
-                user_ids.append(uid)
-                logging.info(f"Utente fittizio {new_user} creato con successo")
-
-                payload["user_ids"] = user_ids
-                self.sim_store.set(simulation_id, payload)
-
-            #3)richiesta della chiave pubblica
-            async with httpx.AsyncClient(base_url=AUTH_BASE, timeout=30.0) as auth:
-
-                r_create = await auth.post(f"elections", json={"votazione_id": f"{votazione_id}"})
-                if r_create.status_code not in (200, 201):
-                    raise RuntimeError(f"Errore create_election: {r_create.text}")
-
-                pk_body = PublicKeyResponse(**r_create.json())
-                pub_key = paillier.PaillierPublicKey(n=int(pk_body.n))
-
-
-            #4)Voto casuale 0/1 per ogni utente generato
-            async with httpx.AsyncClient(base_url=VOTE_BASE, timeout=30.0) as vote_cli:
-                total = body.count
-                for _uid in user_ids:
-                    vote = random.choice([0, 1])
-                    enc = pub_key.encrypt(vote)
-                    ciphertext_int = extract_ciphertext(enc)
-
-                    r_sub = await vote_cli.post(
-                        f"elections/vote",
-                        json={"votazione_id": str(votazione_id),  "ciphertext": str(ciphertext_int), "topic": topic, "num_utenti": total},
-                    )
-                    if r_sub.status_code != 200:
-                        raise RuntimeError(f"Errore submit_vote: {r_sub.text}")
-
-                #5)Ritorna i risultati con richiesta all'endpoint /result
-                r_res = await vote_cli.post(
-                    f"elections/result",
-                    json={"votazione_id": votazione_id, "num_utenti": total},
-                )
-                if r_res.status_code != 200:
-                    raise RuntimeError(f"Errore get_result: {r_res.text}")
-
-
-            row = (
-                supabase.table("votazioni")
-                .select("si,no,concluded")
-                .eq("id", votazione_id)
-                .single()
-                .execute()
-            ).data or {}
+
+            row = await db.get_election_result(votazione_id)
 
             #6)Caricati i risultati salvati nel db dall'endpoint /result
             result = {
@@ -494,47 +1364,273 @@ class VotingSystemAPI:
         except Exception as e:
             logging.info("Entered failure DELETE section cause: %s", e)
             # rollback best-effort (utenti e votazione)
-            sim = self.sim_store.get(simulation_id)
+            sim = await asyncio.to_thread(self.sim_store.get, simulation_id)
             if not sim:
                 raise HTTPException(status_code=404, detail="Simulazione non trovata")
 
-            try:
-                uids = sim.get("user_ids", [])
-                if uids:
-                    delete_election(sim.get("votazione_id"))
-                    for uid in uids:
-                        try:
-                            delete_auth_user(uid)
-                        except Exception:
-                            pass
-            finally:
-                self.sim_store.pop(simulation_id)
+            # utenti salvati nello store più quelli creati dopo l'ultimo checkpoint
+            sim["user_ids"] = list(dict.fromkeys((sim.get("user_ids") or []) + user_ids))
+            report = await self._teardown_simulation(simulation_id, sim)
+            if report["status"] != "ok":
+                raise HTTPException(status_code=500, detail=f"Simulazione fallita: {e}; "
+                                                            f"pulizia incompleta, ripetere /simulation/end: {report}")
             raise HTTPException(status_code=500, detail=f"Simulazione fallita: {e}")
 
 
+    def _get_encrypt_pool(self) -> ProcessPoolExecutor:
+        if self._encrypt_pool is None:
+            self._encrypt_pool = ProcessPoolExecutor(max_workers=max(1, SIM_ENCRYPT_WORKERS))
+        return self._encrypt_pool
+
+    async def _start_synthetic_simulation(self, simulation_id: int, count: int, topic: str, categoria: str,
+                                          seed: int | None) -> SimulationResponse:
+        """
+        Simulazione per il dimensionamento: 'count' ballot sintetici (nessun utente auth) con voti generati
+        da random.Random(seed), aggregati con _aggregate (come /elections/vote, al più SIM_SYNTHETIC_CONCURRENCY
+        in volo) e decifrati con _tally (come /elections/result).
+        I ciphertext sono cifrati con offuscatori derivati da SIM_SYNTHETIC_BASE_OBFUSCATORS valori indipendenti
+        (una moltiplicazione per ballot), così il costo misurato è quello del server e non della cifratura client.
+        La votazione resta nel database fino a /simulation/end.
+        :return SimulationResponse con metrics (throughput e latenze):
+        """
+        rng = random.Random(seed)
+        sim = {"votazione_id": None, "categoria": categoria, "topic": topic, "user_ids": [], "mode": "synthetic",
+               "seed": seed}
+        try:
+            v_res = await db.insert_election(topic, categoria)
+            self.elections_cache.bump()
+            votazione_id = int(v_res.get("id"))
+            vid = str(votazione_id)
+            sim["votazione_id"] = votazione_id
+            await asyncio.to_thread(self.sim_store.set, simulation_id, sim)
+
+            key = await self.pk_cache.get(votazione_id)
+            n_base = max(2, SIM_SYNTHETIC_BASE_OBFUSCATORS)
+            obf_pool = self._obfuscation_pool(votazione_id, key, expected=n_base)
+            base = await obf_pool.take(n_base)
+            obfuscators = PaillierKernel.derived_obfuscators(base, count, key.raw.nsquare, rng)
+
+            sem = asyncio.Semaphore(max(1, SIM_SYNTHETIC_CONCURRENCY))
+            latencies: list[float] = []
+            expected_yes = 0
+            encrypt_seconds = 0.0
+
+            async def submit(c):
+                async with sem:
+                    t0 = time.perf_counter()
+                    await self._aggregate(vid, c, auto_tally=False)
+                    latencies.append(time.perf_counter() - t0)
+
+            started = time.perf_counter()
+            for offset in range(0, count, SIM_SYNTHETIC_CHUNK):
+                size = min(SIM_SYNTHETIC_CHUNK, count - offset)
+                t0 = time.perf_counter()
+                votes = [rng.randint(0, 1) for _ in range(size)]
+                expected_yes += sum(votes)
+                ciphertexts = [PaillierKernel.encrypt_with(key.raw, m, next(obfuscators)) for m in votes]
+                encrypt_seconds += time.perf_counter() - t0
+                await asyncio.gather(*(submit(c) for c in ciphertexts))
+            aggregate_seconds = time.perf_counter() - started - encrypt_seconds
+
+            t0 = time.perf_counter()
+            r_res = await self._tally(vid, count)
+            tally_seconds = time.perf_counter() - t0
+            if r_res.get("status") != "ok":
+                raise RuntimeError(f"Errore get_result: {r_res}")
+        except Exception as e:
+            logging.info("Simulazione sintetica %s fallita: %s", simulation_id, e)
+            if sim["votazione_id"] is not None:
+                await self._teardown_simulation(simulation_id, sim)
+            else:
+                await asyncio.to_thread(self.sim_store.pop, simulation_id)
+            raise HTTPException(status_code=500, detail=f"Simulazione fallita: {e}")
+
+        yes_total = int(r_res["si"])
+        no_total = int(r_res["no"])
+        latencies.sort()
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        metrics = {
+            "ballots": count,
+            "encrypt_seconds": encrypt_seconds,
+            "aggregate_seconds": aggregate_seconds,
+            "aggregate_votes_per_sec": count / aggregate_seconds if aggregate_seconds > 0 else 0.0,
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95),
+            "latency_p99_ms": percentile(0.99),
+            "latency_max_ms": latencies[-1] * 1000,
+            "tally_seconds": tally_seconds,
+            "tally_matches_expected": float(yes_total == expected_yes),
+        }
+        logging.info("Simulazione sintetica %s: %s", simulation_id, metrics)
+        return SimulationResponse(
+            simulation_id=simulation_id,
+            categoria=categoria,
+            votazione_id=votazione_id,
+            generated_users=[],
+            result={"Totale SI": yes_total, "Totale NO": no_total, "Totale voti": yes_total + no_total},
+            metrics=metrics,
+        )
+
+    def _obfuscation_pool(self, votazione_id, key, expected: int | None = None) -> ObfuscationPool:
+        """
+        Restituisce (creandola e avviandone il riempimento) la scorta di offuscatori per la chiave della votazione.
+        expected: numero di offuscatori che serviranno (es. votanti della simulazione), limita la scorta
+        """
+        vid = str(votazione_id)
+        pool = self.obf_pools.get(vid)
+        if pool is None or pool.raw.n != key.raw.n:
+            if pool is not None:
+                pool.close()
+            # scorta dimensionata sul fabbisogno noto: riempita una volta sola, non ricaricata una volta consumata
+            size, low = (min(OBF_POOL_SIZE, expected), 0) if expected else (OBF_POOL_SIZE, OBF_POOL_LOW)
+            pool = ObfuscationPool(key.public_key.n, self._get_encrypt_pool, size=size,
+                                   low_watermark=low, chunk=OBF_POOL_CHUNK,
+                                   parallelism=SIM_ENCRYPT_WORKERS)
+            pool.start()
+            self.obf_pools[vid] = pool
+        return pool
+
+    def _forget_key(self, votazione_id):
+        """
+        Votazione conclusa o eliminata: rimuove la chiave dalla cache, i limiti di admission control
+        e la scorta di offuscatori
+        """
+        self.pk_cache.invalidate(votazione_id)
+        self.admission.forget(str(votazione_id))
+        pool = self.obf_pools.pop(str(votazione_id), None)
+        if pool is not None:
+            pool.close()
+
+    async def _provision_users(self, simulation_id: int, count: int, categoria: str, payload: dict,
+                               generated_users: list, user_ids: list):
+        """
+        Crea 'count' utenti fittizi con al più SIM_PROVISION_CONCURRENCY creazioni contemporanee,
+        poi aggiorna tutti i profili con un unico upsert.
+        user_ids viene riempita man mano, così in caso di errore il rollback conosce ogni utente creato;
+        lo store delle simulazioni viene aggiornato ogni SIM_CHECKPOINT_EVERY utenti e alla fine.
+        """
+        sem = asyncio.Semaphore(max(1, SIM_PROVISION_CONCURRENCY))
+        failed = asyncio.Event()
+        users: list[User | None] = [None] * count
+
+        async def provision(i: int):
+            async with sem:
+                # dopo il primo errore non vengono creati altri utenti
+                if failed.is_set():
+                    return
+                nome, cognome = rand_name()
+                email = make_email(nome, cognome, simulation_id, i)
+                password = rand_password()
+                if not is_valid_email(email):
+                    email = make_email(nome.replace(" ", ""), cognome.replace(" ", ""), simulation_id, i)
+
+                try:
+                    uid = await db.create_auth_user(email, password, simulation_id)
+                except Exception:
+                    failed.set()
+                    raise
+                logging.info("uid generato: %s", uid)
+
+                user_ids.append(uid)
+                users[i] = User(id=uid, nome=nome, cognome=cognome, categoria=categoria)
+                if len(user_ids) % max(1, SIM_CHECKPOINT_EVERY) == 0:
+                    payload["user_ids"] = list(user_ids)
+                    await asyncio.to_thread(self.sim_store.set, simulation_id, dict(payload))
+
+        results = await asyncio.gather(*(provision(i) for i in range(count)), return_exceptions=True)
+
+        payload["user_ids"] = list(user_ids)
+        await asyncio.to_thread(self.sim_store.set, simulation_id, payload)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+        generated_users.extend(u for u in users if u is not None)
+        try:
+            await db.upsert_profiles([
+                {"id": u.id, "nome": u.nome, "cognome": u.cognome, "categoria": u.categoria} for u in generated_users
+            ])
+        finally:
+            # dopo la scrittura: una lettura concorrente non può rimettere in cache i profili vecchi
+            self.users_cache.clear()
+        logging.info("Creati %d utenti fittizi per la simulazione %s", len(generated_users), simulation_id)
+
     async def end_simulation(self, payload: SimulationEndModel):
         """
         Chiude la simulazione eliminando gli UTENTI di test e la votazione effettuata
-        L’aggregatore viene pulito quando /result marca la votazione come conclusa
+        L’aggregatore viene pulito quando /result marca la votazione come conclusa.
+        Se qualche eliminazione fallisce la simulazione resta nello store e una nuova chiamata riprende da lì.
         :param payload:
-        :return void:
+        :return report {status: ok|partial, deleted_users, failed_users, ...}:
         """
         simulation_id = payload.simulation_id
-        sim = self.sim_store.get(simulation_id)
+        sim = await asyncio.to_thread(self.sim_store.get, simulation_id)
         if not sim:
             raise HTTPException(status_code=404, detail="Simulazione non trovata")
 
-        user_ids = sim["user_ids"]
+        return await self._teardown_simulation(simulation_id, sim)
 
-        try:
-            delete_election(sim.get("votazione_id"))
-            if user_ids:
-                for uid in user_ids:
-                        delete_auth_user(uid)
+    async def _teardown_simulation(self, simulation_id: int, sim: dict) -> dict:
+        """
+        Elimina votazione, righe 'votes'/'profiles' (un filtro in_ per tabella) e utenti auth della simulazione
+        (al più SIM_TEARDOWN_CONCURRENCY alla volta). Non si ferma al primo errore: lo stato residuo
+        (election_deleted, pending_data_ids, pending_user_ids) viene salvato nello store per poter riprendere.
+        :return report:
+        """
+        pending = sim.get("pending_user_ids")
+        if pending is None:
+            pending = list(sim.get("user_ids") or [])
+        pending_data = sim.get("pending_data_ids")
+        if pending_data is None:
+            pending_data = list(sim.get("user_ids") or [])
+        report = {"status": "ok", "simulation_id": simulation_id, "deleted_users": 0, "failed_users": [],
+                  "errors": []}
+
+        if not sim.get("election_deleted"):
+            try:
+                await db.delete_election(sim.get("votazione_id"))
+                self.elections_cache.bump()
+                self._forget_key(sim.get("votazione_id"))
+                await self._forget_election(str(sim.get("votazione_id")))
+                sim["election_deleted"] = True
+            except Exception as e:
+                report["errors"].append(f"votazione {sim.get('votazione_id')}: {e}")
 
-            self.sim_store.pop(simulation_id)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Errore durante la chiusura della simulazione: {e}")
+        if pending_data:
+            try:
+                await db.delete_users_data(pending_data)
+                self.users_cache.clear()
+                pending_data = []
+            except Exception as e:
+                report["errors"].append(f"votes/profiles: {e}")
+
+        sem = asyncio.Semaphore(max(1, SIM_TEARDOWN_CONCURRENCY))
+
+        async def delete_one(uid: str):
+            async with sem:
+                await db.delete_auth_user(uid)
+
+        results = await asyncio.gather(*(delete_one(uid) for uid in pending), return_exceptions=True)
+        failed = []
+        for uid, res in zip(pending, results):
+            if isinstance(res, Exception):
+                failed.append(uid)
+                report["errors"].append(f"utente {uid}: {res}")
+        report["deleted_users"] = len(pending) - len(failed)
+        report["failed_users"] = failed
+
+        if report["errors"]:
+            report["status"] = "partial"
+            sim["pending_user_ids"] = failed
+            sim["pending_data_ids"] = pending_data
+            await asyncio.to_thread(self.sim_store.set, simulation_id, sim)
+            logging.info("Chiusura simulazione %s incompleta: %s", simulation_id, report["errors"])
+        else:
+            await asyncio.to_thread(self.sim_store.pop, simulation_id)
+        return report
 
     async def new_election(self, payload: NewElectionModel):
         """
@@ -543,10 +1639,24 @@ class VotingSystemAPI:
         :return votazione_id:
         """
         try:
-            return insert_election(payload.topic, payload.categoria)
+            row = await db.insert_election(payload.topic, payload.categoria)
+            self.elections_cache.bump()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Errore inserimento votazione: {e}")
 
+        # la chiave viene generata dall'Authority e messa in cache prima del primo voto
+        self.pk_cache.prewarm(row.get("id"))
+        admission = {k: v for k, v in (("max_inflight", payload.admission_max_inflight),
+                                       ("max_queue", payload.admission_max_queue)) if v is not None}
+        if admission:
+            self.admission.configure(str(row.get("id")), **admission)
+        try:
+            await self._register_expected(str(row.get("id")), payload.categoria, payload.num_utenti, admission)
+        except Exception as e:
+            # verranno ricavati al primo voto
+            logging.info("Votanti attesi della votazione %s non registrati: %s", row.get("id"), e)
+        return row
+
     async def delete_election(self, payload: DeleteElectionModel):
         """
         Elimina una specifica votazione
@@ -554,19 +1664,31 @@ class VotingSystemAPI:
         :return voidd:
         """
         try:
-            delete_election(payload.votazione_id)
+            await db.delete_election(payload.votazione_id)
+            self.elections_cache.bump()
+            self._forget_key(payload.votazione_id)
+            await self._forget_election(str(payload.votazione_id))
         except Exception as e:
-            logging.info(f"Errore eliminazione: {e}")
+            logging.info("Errore eliminazione: %s", e)
             raise HTTPException(status_code=500, detail=f"Impossibile eliminare la categoria: {e}")
 
-    async def list_categorie(self):
+    async def _forget_election(self, votazione_id: str):
+        """
+        Votazione eliminata: rimuove votanti attesi, risultato in memoria e metadati salvati
+        """
+        self.expected.pop(votazione_id, None)
+        self.results.pop(votazione_id)
+        self.pk_cache.forget(votazione_id)
+        await asyncio.to_thread(self.elections_store.pop, votazione_id)
+
+    async def list_categorie(self, if_none_match: str | None = Header(None)):
         """
-        Resituisce la lista aggiornata delle categorie
+        Resituisce la lista aggiornata delle categorie (304 se l'ETag del client è ancora valido)
         :return [str]:
         """
         try:
-           return get_categorie()
+            return await self._cached_list(self.categorie_cache, db.get_categorie, if_none_match)
         except Exception as e:
-            logging.info(f"Errore selezione categorie: {e}")
+            logging.info("Errore selezione categorie: %s", e)
             raise HTTPException(status_code=500, detail=f"Errore selezione categorie: {e}")
 
@@ -0,0 +1,125 @@
+"""
+Microbenchmark della somma omomorfica: phe.EncryptedNumber contro PaillierKernel (int e, se installato, gmpy2).
+
+Uso (dalla root del repository):
+    python -m benchmarks.bench_paillier_kernel [--bits 2048 4096] [--ops 2000] [--out risultati.json]
+
+Per i tempi non serve una vera coppia di chiavi: basta un n dispari della dimensione richiesta
+e ciphertext casuali in (0, n²).
+
+Gli speedup sono riportati separatamente per il kernel con int di Python e con gmpy2, rispetto a phe senza
+offuscamento (phe_add) e al percorso originale che offusca a ogni voto (phe_add_secure). Il guadagno rispetto
+al percorso originale viene quasi tutto dal non ri-offuscare la somma (reobfuscation_cost); rispetto a phe_add
+il kernel gmpy2 guadagna poco, sempre meno al crescere della chiave (phe usa già gmpy2 se installato),
+e quello con int è più lento.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from phe import paillier
+
+import PaillierKernel
+
+
+def fake_key(bits: int, rng: random.Random) -> paillier.PaillierPublicKey:
+    n = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+    return paillier.PaillierPublicKey(n=n)
+
+
+def timed(fn, ops: int) -> float:
+    """
+    Ritorna i microsecondi medi per operazione
+    """
+    start = time.perf_counter()
+    fn(ops)
+    return (time.perf_counter() - start) / ops * 1e6
+
+
+def bench_bits(bits: int, ops: int, secure_ops: int, rng: random.Random) -> dict:
+    pk = fake_key(bits, rng)
+    nsquare = pk.nsquare
+    votes = [rng.randrange(1, nsquare) for _ in range(ops)]
+
+    def phe_add(k):
+        acc = paillier.EncryptedNumber(pk, votes[0], 0)
+        for c in votes[:k]:
+            acc = acc + paillier.EncryptedNumber(pk, c, 0)
+        return acc.ciphertext(be_secure=False)
+
+    def phe_add_secure(k):
+        # percorso originale di submit_vote: ciphertext() offusca la somma a ogni voto
+        acc_c = votes[0]
+        for c in votes[:k]:
+            acc_c = (paillier.EncryptedNumber(pk, acc_c, 0) + paillier.EncryptedNumber(pk, c, 0)).ciphertext()
+        return acc_c
+
+    def kernel_int(k):
+        acc = votes[0]
+        for c in votes[:k]:
+            acc = acc * c % nsquare
+        return acc
+
+    results = {
+        "phe_add_us": timed(phe_add, ops),
+        "phe_add_secure_us": timed(phe_add_secure, secure_ops),
+        "kernel_int_us": timed(kernel_int, ops),
+    }
+
+    if PaillierKernel.HAVE_GMPY2:
+        raw = PaillierKernel.RawKey(pk.n)
+        native_votes = [PaillierKernel.to_native(c) for c in votes]
+
+        def kernel_native(k):
+            acc = native_votes[0]
+            for c in native_votes[:k]:
+                acc = PaillierKernel.add(acc, c, raw.nsquare)
+            return acc
+
+        results["kernel_gmpy2_us"] = timed(kernel_native, ops)
+
+    def tree(k):
+        return PaillierKernel.tree_sum(votes[:k], nsquare)
+
+    results["tree_sum_us"] = timed(tree, ops)
+
+    # quanto costa l'offuscamento a ogni voto, indipendentemente dal kernel
+    results["reobfuscation_cost"] = results["phe_add_secure_us"] / results["phe_add_us"]
+    for impl in ("int", "gmpy2"):
+        us = results.get(f"kernel_{impl}_us")
+        if us is None:
+            continue
+        results[f"speedup_{impl}_vs_phe"] = results["phe_add_us"] / us
+        results[f"speedup_{impl}_vs_phe_secure"] = results["phe_add_secure_us"] / us
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bits", type=int, nargs="+", default=[2048, 4096])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--secure-ops", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=str, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    report = {"gmpy2": PaillierKernel.HAVE_GMPY2, "ops": args.ops, "results": {}}
+    for bits in args.bits:
+        res = bench_bits(bits, args.ops, args.secure_ops, rng)
+        report["results"][str(bits)] = res
+        print(f"{bits}-bit: " + ", ".join(f"{k}={v:.2f}" for k, v in res.items()))
+    print("Nota: lo speedup rispetto a phe_add_secure viene soprattutto dal non ri-offuscare la somma "
+          "(reobfuscation_cost), non dal kernel; rispetto a phe_add conta solo l'implementazione (int o gmpy2).")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Suite di benchmark del percorso di aggregazione. Misura separatamente:
+  - accumulators : get/set degli accumulatori (file, log, sqlite) al crescere delle votazioni aperte
+  - simulation_store : costo di next_id/set di SimulationStore (file e sqlite)
+  - paillier     : somma omomorfica a 1024, 2048 e 4096 bit (vedi bench_paillier_kernel)
+  - endpoints    : latenza di /elections/vote e /elections/result tramite il TestClient di FastAPI,
+                   con AuthorityStub e MemorySupabase al posto degli upstream
+
+Uso (dalla root del repository):
+    python -m benchmarks.run_benchmarks --out bench.json [--quick] [--only accumulators paillier]
+    python -m benchmarks.run_benchmarks --out nuovo.json --baseline bench.json --tolerance 0.2
+
+Con --baseline le metriche di tempo peggiorate oltre la tolleranza vengono elencate e il processo esce con 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.bench_paillier_kernel import bench_bits
+import PaillierKernel
+
+
+def percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+
+    def pick(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "mean_ms": statistics.fmean(samples) * 1000}
+
+
+# ---------------------------------------------------------------------
+# ACCUMULATORI
+# ---------------------------------------------------------------------
+
+def bench_accumulators(quick: bool) -> dict:
+    from FileAccumulator import FileAccumulator
+    from LogAccumulator import LogAccumulator
+    from SqliteAccumulator import SqliteAccumulator
+
+    open_counts = [1, 10, 100] if quick else [1, 10, 100, 1000]
+    ops = 100 if quick else 500
+    rng = random.Random(1)
+    # ciphertext della dimensione di n² per chiavi a 2048 bit
+    c = rng.getrandbits(4096)
+    engines = {
+        "file": lambda d: FileAccumulator(os.path.join(d, "votazioni.json")),
+        "log": lambda d: LogAccumulator(os.path.join(d, "log")),
+        "sqlite": lambda d: SqliteAccumulator(os.path.join(d, "acc.sqlite3")),
+    }
+    results = {}
+    for name, factory in engines.items():
+        results[name] = {}
+        for open_elections in open_counts:
+            with tempfile.TemporaryDirectory() as d:
+                acc = factory(d)
+                acc.set_many({str(i): (c, 0, 1) for i in range(open_elections)})
+                ids = [str(rng.randrange(open_elections)) for _ in range(ops)]
+
+                t0 = time.perf_counter()
+                for i in ids:
+                    acc.set(i, c, 0, 2)
+                set_s = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                for i in ids:
+                    acc.get(i)
+                get_s = time.perf_counter() - t0
+
+                if hasattr(acc, "close"):
+                    acc.close()
+            results[name][str(open_elections)] = {
+                "set_us": set_s / ops * 1e6, "get_us": get_s / ops * 1e6,
+                "set_per_sec": ops / set_s, "get_per_sec": ops / get_s,
+            }
+            print(f"accumulators {name} open={open_elections}: {results[name][str(open_elections)]}")
+    return results
+
+
+# ---------------------------------------------------------------------
+# SIMULATION STORE
+# ---------------------------------------------------------------------
+
+def bench_simulation_store(quick: bool) -> dict:
+    from SimulationStore import SimulationStore
+    from SqliteSimulationStore import SqliteSimulationStore
+
+    ops = 100 if quick else 500
+    payload = {"votazione_id": 1, "categoria": "bench", "topic": "bench", "user_ids": [f"u{i}" for i in range(30)]}
+    engines = {
+        "file": lambda d: SimulationStore(os.path.join(d, "simulations.json")),
+        "sqlite": lambda d: SqliteSimulationStore(os.path.join(d, "sim.sqlite3")),
+    }
+    results = {}
+    for name, factory in engines.items():
+        with tempfile.TemporaryDirectory() as d:
+            store = factory(d)
+            t0 = time.perf_counter()
+            ids = [store.next_id() for _ in range(ops)]
+            next_id_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for sim_id in ids:
+                store.set(sim_id, payload)
+            set_s = time.perf_counter() - t0
+        results[name] = {"next_id_us": next_id_s / ops * 1e6, "set_us": set_s / ops * 1e6}
+        print(f"simulation_store {name}: {results[name]}")
+    return results
+
+
+# ---------------------------------------------------------------------
+# PAILLIER
+# ---------------------------------------------------------------------
+
+def bench_paillier(quick: bool) -> dict:
+    rng = random.Random(1)
+    ops = 300 if quick else 2000
+    secure_ops = 3 if quick else 10
+    results = {}
+    for bits in (1024, 2048, 4096):
+        results[str(bits)] = bench_bits(bits, ops, secure_ops, rng)
+        print(f"paillier {bits}: {results[str(bits)]}")
+    return results
+
+
+# ---------------------------------------------------------------------
+# ENDPOINT (TestClient con AuthorityStub e MemorySupabase)
+# ---------------------------------------------------------------------
+
+def bench_endpoints(quick: bool) -> dict:
+    votes = 200 if quick else 2000
+    elections = 5 if quick else 20
+    key_bits = 1024 if quick else 2048
+
+    # Supabase in memoria e Authority in-process (vanno impostati prima di importare Config)
+    os.environ["SUPABASE_BACKEND"] = "memory"
+    os.environ["AUTHORITY_BACKEND"] = "local"
+    os.environ["AUTHORITY_KEY_BITS"] = str(key_bits)
+
+    workdir = tempfile.mkdtemp(prefix="aggregator-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from phe import paillier
+        from VotingSystemAPI import VotingSystemAPI
+
+        api = VotingSystemAPI()
+        app = FastAPI()
+        app.include_router(api.router)
+
+        # chiavi generate prima delle misure: le votazioni di MemorySupabase ricevono gli id 1..N
+        for vid in range(1, elections + 1):
+            api.authority_stub.keys[vid] = paillier.generate_paillier_keypair(n_length=key_bits)
+
+        # ciphertext preparati prima delle misure: la cifratura è lavoro del client
+        rng = random.Random(1)
+        plan = []
+        for i in range(votes):
+            vid = 1 + i % elections
+            pk = api.authority_stub.keys[vid][0]
+            plan.append((vid, str(pk.encrypt(rng.randint(0, 1)).ciphertext())))
+
+        vote_lat, result_lat = [], []
+        with TestClient(app) as client:
+            for _ in range(elections):
+                client.post("/api/aggregator/elections/insert", json={"topic": "bench", "categoria": "bench"}).raise_for_status()
+
+            for vid, ciphertext in plan:
+                t0 = time.perf_counter()
+                r = client.post("/api/aggregator/elections/vote",
+                                json={"votazione_id": vid, "ciphertext": ciphertext, "topic": "bench", "num_utenti": 0})
+                vote_lat.append(time.perf_counter() - t0)
+                r.raise_for_status()
+
+            per_election = votes // elections
+            for vid in range(1, elections + 1):
+                t0 = time.perf_counter()
+                r = client.post("/api/aggregator/elections/result", json={"votazione_id": vid, "num_utenti": per_election})
+                result_lat.append(time.perf_counter() - t0)
+                r.raise_for_status()
+    finally:
+        os.chdir(cwd)
+
+    results = {
+        "key_bits": key_bits,
+        "submit_vote": {"requests": votes, **percentiles(vote_lat)},
+        "get_result": {"requests": elections, **percentiles(result_lat)},
+    }
+    print(f"endpoints: {results}")
+    return results
+
+
+# ---------------------------------------------------------------------
+# CONFRONTO CON UNA BASELINE
+# ---------------------------------------------------------------------
+
+# metriche in cui un valore più alto è un peggioramento
+TIME_SUFFIXES = ("_us", "_ms")
+
+
+def flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    cur = flatten(current["results"])
+    base = flatten(baseline["results"])
+    regressions = []
+    for key, value in cur.items():
+        if not key.endswith(TIME_SUFFIXES) or key not in base or base[key] <= 0:
+            continue
+        ratio = value / base[key]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{key}: {base[key]:.2f} -> {value:.2f} (+{(ratio - 1) * 100:.0f}%)")
+    return regressions
+
+
+BENCHES = {
+    "accumulators": bench_accumulators,
+    "simulation_store": bench_simulation_store,
+    "paillier": bench_paillier,
+    "endpoints": bench_endpoints,
+}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=str, default=str(ROOT / "benchmarks" / "bench_results.json"))
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHES), default=None)
+    parser.add_argument("--quick", action="store_true", help="meno iterazioni (per CI o verifiche veloci)")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON di una run precedente da confrontare")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="peggioramento ammesso (0.2 = +20%%)")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "gmpy2": PaillierKernel.HAVE_GMPY2,
+            "quick": args.quick,
+        },
+        "results": {},
+    }
+    for name in args.only or BENCHES:
+        report["results"][name] = BENCHES[name](args.quick)
+
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"Risultati scritti in {args.out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressioni rispetto alla baseline:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print("Nessuna regressione rispetto alla baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,17 +9,33 @@ from VotingSystemAPI import VotingSystemAPI
 
 
 
-app = FastAPI()
+voting_api = VotingSystemAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # client HTTP condivisi verso Authority/aggregatore: aperti all'avvio, chiusi allo shutdown
+    await voting_api.startup()
+    try:
+        yield
+    finally:
+        await voting_api.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # cursor della pagina successiva di /elections/users ed ETag delle liste, leggibili anche dal frontend
+    expose_headers=["X-Next-Cursor", "ETag"]
 )
 
 
-voting_api = VotingSystemAPI()
 app.include_router(voting_api.router)
+# metriche Prometheus alla radice, dove gli scraper le cercano di default
+app.add_api_route("/metrics", voting_api.metrics, methods=["GET"], include_in_schema=False)
 